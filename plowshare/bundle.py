@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Storj Labs
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import os
+import tarfile
+
+
+def pack(filenames, bundle):
+    """Pack files into an uncompressed tar archive.
+
+    The contents of every member are stored contiguously in the archive,
+    so each one can later be read back with a single byte range.
+
+    :param filenames: Filenames of the files to pack.
+    :type filenames: list
+    :param bundle: Filename of the archive to create.
+    :type bundle: str
+    :returns: A list with a dict per file, in order, with the 'filename'
+              it was packed from, its member 'name', and the 'offset' and
+              'length' of its contents in the archive.
+    :rtype: list
+    """
+    with tarfile.open(bundle, 'w', format=tarfile.GNU_FORMAT) as archive:
+        for filename in filenames:
+            archive.add(filename, os.path.basename(filename), recursive=False)
+
+    with tarfile.open(bundle, 'r') as archive:
+        return [{'filename': filename, 'name': member.name,
+                 'offset': member.offset_data, 'length': member.size}
+                for filename, member in zip(filenames, archive.getmembers())]
+
+
+def extract(bundle, offset, length, destination):
+    """Copy one member's contents out of a bundle.
+
+    :param bundle: Filename of the archive.
+    :type bundle: str
+    :param offset: Position of the member's contents in the archive.
+    :type offset: int
+    :param length: Size of the member's contents.
+    :type length: int
+    :param destination: File-like object to write the contents to.
+    :type destination: file
+    """
+    with open(bundle, 'rb') as f:
+        f.seek(offset)
+        while length > 0:
+            data = f.read(min(length, 1024 * 1024))
+            if not data:
+                raise EOFError('bundle is truncated')
+            destination.write(data)
+            length -= len(data)
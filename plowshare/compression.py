@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Storj Labs
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import math
+import os
+import time
+import zlib
+from collections import Counter
+
+try:
+    import lzma
+except ImportError:
+    lzma = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from . import settings
+
+# Size of the blocks read and written while streaming.
+BLOCK_SIZE = 1024 * 1024
+
+
+def _zlib_codec():
+    return {
+        'levels': [1, 6],
+        'compressor': lambda level: zlib.compressobj(level),
+        'decompressor': lambda: zlib.decompressobj(),
+    }
+
+
+def _lzma_codec():
+    return {
+        'levels': [0, 6],
+        'compressor': lambda level: lzma.LZMACompressor(preset=level),
+        'decompressor': lambda: lzma.LZMADecompressor(),
+    }
+
+
+def _zstd_codec():
+    return {
+        'levels': [3, 12],
+        'compressor': lambda level:
+            zstandard.ZstdCompressor(level=level).compressobj(),
+        'decompressor': lambda:
+            zstandard.ZstdDecompressor().decompressobj(),
+    }
+
+
+codecs = {'zlib': _zlib_codec()}
+if lzma is not None:
+    codecs['lzma'] = _lzma_codec()
+if zstandard is not None:
+    codecs['zstd'] = _zstd_codec()
+
+
+def entropy(data):
+    """Compute the Shannon entropy of the given bytes, in bits per byte.
+
+    >>> entropy(b'aaaa')
+    0.0
+    >>> entropy(b'abab')
+    1.0
+
+    :param data: Bytes to measure.
+    :type data: bytes
+    :returns: Entropy between 0 (constant) and 8 (random).
+    :rtype: float
+    """
+    if not data:
+        return 0.0
+    total = float(len(data))
+    return -sum(count / total * math.log(count / total, 2)
+                for count in Counter(bytearray(data)).values()) or 0.0
+
+
+def sample(filename, size=settings.COMPRESSION_SAMPLE_SIZE):
+    """Read a sample of a file spread over its beginning, middle and end.
+
+    :param filename: The filename of the file to sample.
+    :type filename: str
+    :param size: Approximate size of the sample in bytes.
+    :type size: int
+    :returns: The sampled bytes.
+    :rtype: bytes
+    """
+    file_size = os.path.getsize(filename)
+    with open(filename, 'rb') as f:
+        if file_size <= size:
+            return f.read()
+        block = size // 3
+        data = []
+        for offset in (0, (file_size - block) // 2, file_size - block):
+            f.seek(offset)
+            data.append(f.read(block))
+        return b''.join(data)
+
+
+def choose_codec(filename, bandwidth=settings.COMPRESSION_BANDWIDTH):
+    """Choose the codec and level that minimize the time to upload a file.
+
+    A sample of the file is compressed with every available codec and
+    level, and the one with the lowest estimated compression plus transfer
+    time per byte is chosen, given the expected upload bandwidth. Samples
+    that look random enough are not compressed at all.
+
+    :param filename: The filename of the file to upload.
+    :type filename: str
+    :param bandwidth: Expected upload bandwidth in bytes per second.
+    :type bandwidth: float
+    :returns: A (codec, level) tuple, or None if compressing does not pay.
+    :rtype: tuple
+    """
+    data = sample(filename)
+    if not data or entropy(data) > settings.COMPRESSION_MAX_ENTROPY:
+        return None
+
+    best, best_cost = None, 1.0 / bandwidth
+    for name, codec in codecs.items():
+        for level in codec['levels']:
+            start = time.time()
+            compressor = codec['compressor'](level)
+            compressed = len(compressor.compress(data)) + \
+                len(compressor.flush())
+            elapsed = max(time.time() - start, 1e-9)
+            cost = (elapsed + compressed / float(bandwidth)) / len(data)
+            if cost < best_cost:
+                best, best_cost = (name, level), cost
+    return best
+
+
+def compress_file(source, destination, codec, level):
+    """Compress a file into another, one block at a time.
+
+    :param source: The filename of the file to compress.
+    :type source: str
+    :param destination: The filename of the compressed file.
+    :type destination: str
+    :param codec: Name of the codec, as found in codecs.
+    :type codec: str
+    :param level: Compression level for the codec.
+    :type level: int
+    """
+    compressor = codecs[codec]['compressor'](level)
+    with open(source, 'rb') as src, open(destination, 'wb') as dst:
+        for block in iter(lambda: src.read(BLOCK_SIZE), b''):
+            dst.write(compressor.compress(block))
+        dst.write(compressor.flush())
+
+
+def decompress_stream(source, destination, codec):
+    """Decompress a readable stream into a writable one, block by block.
+
+    :param source: File-like object with compressed data.
+    :type source: file
+    :param destination: File-like object for the decompressed data.
+    :type destination: file
+    :param codec: Name of the codec, as found in codecs.
+    :type codec: str
+    :returns: Number of decompressed bytes written.
+    :rtype: int
+    """
+    decompressor = codecs[codec]['decompressor']()
+    written = 0
+    for block in iter(lambda: source.read(BLOCK_SIZE), b''):
+        data = decompressor.decompress(block)
+        destination.write(data)
+        written += len(data)
+    if hasattr(decompressor, 'flush'):
+        data = decompressor.flush()
+        destination.write(data)
+        written += len(data)
+    return written
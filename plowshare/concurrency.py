@@ -0,0 +1,268 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Storj Labs
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+
+from . import settings
+
+
+class Cancelled(Exception):
+
+    """Raised when a transfer is cancelled while waiting for a slot."""
+
+
+class AdaptiveLimit(object):
+
+    """Limit on simultaneous transfers to a host, adapted with AIMD.
+
+    Each completed transfer adjusts the limit: it grows additively (by one
+    per full window of transfers) while the host's aggregate throughput
+    holds up and transfers succeed, and is cut multiplicatively when a
+    transfer fails or throughput collapses.
+
+    Transfers waiting for a slot get it by priority, and by earliest
+    deadline within the same priority, then in arrival order.
+    """
+
+    def __init__(self, initial=settings.AIMD_INITIAL_LIMIT,
+                 ceiling=settings.AIMD_MAX_LIMIT):
+        """Initialize the limit.
+
+        :param initial: Number of simultaneous transfers allowed at first.
+        :type initial: int
+        :param ceiling: Highest number of simultaneous transfers allowed.
+        :type ceiling: int
+        """
+        self.ceiling = ceiling
+        self.limit = float(min(initial, ceiling))
+        self.in_flight = 0
+        self.rate = None
+        self.throughput = None
+        self._waiting = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+
+    def acquire(self, priority=0, deadline=None, cancelled=None):
+        """Block until a transfer slot is available to us, then take it.
+
+        :param priority: Higher priorities get a slot first.
+        :type priority: int
+        :param deadline: Time (as in time.time()) by which the transfer
+                         must be done, or None.
+        :type deadline: float
+        :param cancelled: Event set once the transfer is no longer wanted.
+                          Waiters check it whenever they are woken (see
+                          interrupt).
+        :type cancelled: threading.Event
+        :raises: Cancelled
+        """
+        with self._condition:
+            entry = (-priority, deadline if deadline is not None else
+                     float('inf'), next(self._counter))
+            heapq.heappush(self._waiting, entry)
+            while True:
+                if cancelled is not None and cancelled.is_set():
+                    self._waiting.remove(entry)
+                    heapq.heapify(self._waiting)
+                    self._condition.notify_all()
+                    raise Cancelled('transfer cancelled')
+                if self.in_flight < int(self.limit) and \
+                        self._waiting[0] == entry:
+                    break
+                self._condition.wait()
+            heapq.heappop(self._waiting)
+            self.in_flight += 1
+            self._condition.notify_all()
+
+    def abandon(self):
+        """Give a slot back without adapting the limit, for a transfer
+        that was cancelled."""
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def interrupt(self):
+        """Wake every waiter, so that cancelled ones give up."""
+        with self._condition:
+            self._condition.notify_all()
+
+    def release(self, success, size=None, elapsed=None):
+        """Give a transfer slot back and adapt the limit to its outcome.
+
+        :param success: Whether the transfer succeeded.
+        :type success: bool
+        :param size: Number of bytes transferred, if known.
+        :type size: int
+        :param elapsed: Duration of the transfer in seconds.
+        :type elapsed: float
+        """
+        with self._condition:
+            concurrent = self.in_flight
+            self.in_flight -= 1
+
+            throughput = None
+            if success and size and elapsed:
+                rate = size / float(elapsed)
+                throughput = rate * concurrent
+                self.rate = self._smooth(self.rate, rate)
+
+            if not success or throughput is not None and \
+                    self.throughput is not None and \
+                    throughput < self.throughput * \
+                    settings.AIMD_COLLAPSE_RATIO:
+                self.limit = max(
+                    1.0, self.limit * settings.AIMD_DECREASE_FACTOR)
+            elif throughput is None or self.throughput is None or \
+                    throughput >= self.throughput:
+                self.limit = min(
+                    float(self.ceiling), self.limit + 1.0 / int(self.limit))
+
+            if throughput is not None:
+                self.throughput = self._smooth(self.throughput, throughput)
+            self._condition.notify_all()
+
+    def _smooth(self, average, value):
+        if average is None:
+            return value
+        return average + settings.AIMD_SMOOTHING * (value - average)
+
+
+class Slot(object):
+
+    """Outcome of a transfer made within a ConcurrencyController slot."""
+
+    def __init__(self):
+        self.success = False
+        self.size = None
+        self.discarded = False
+
+    def succeed(self, size=None):
+        """Mark the transfer as successful.
+
+        :param size: Number of bytes transferred, if known.
+        :type size: int
+        """
+        self.success = True
+        self.size = size
+
+    def discard(self):
+        """Leave a failed transfer out of the host's record, as the
+        failure says nothing about the host."""
+        self.discarded = True
+
+
+class ConcurrencyController(object):
+
+    """Adaptive limits on simultaneous transfers, one per host.
+
+    A single controller is meant to be shared by every upload and download
+    path, so the limits hold across calls and across threads.
+    """
+
+    def __init__(self, registry=None):
+        """Initialize the controller.
+
+        :param registry: Host capabilities, whose max_concurrency caps the
+                         adaptive limits.
+        :type registry: hosts.HostRegistry
+        """
+        self.registry = registry
+        self._limits = {}
+        self._lock = threading.Lock()
+
+    def limit(self, host):
+        """Return the adaptive limit of a host, creating it if needed.
+
+        :param host: Name of the host.
+        :type host: str
+        :rtype: AdaptiveLimit
+        """
+        with self._lock:
+            if host not in self._limits:
+                ceiling = settings.AIMD_MAX_LIMIT
+                if self.registry is not None and \
+                        self.registry[host].max_concurrency:
+                    ceiling = self.registry[host].max_concurrency
+                self._limits[host] = AdaptiveLimit(ceiling=ceiling)
+            return self._limits[host]
+
+    def rate(self, host):
+        """Return the smoothed per-transfer rate of a host, in bytes/second.
+
+        :param host: Name of the host.
+        :type host: str
+        :returns: The measured rate, or None if nothing was measured yet.
+        :rtype: float
+        """
+        return self.limit(host).rate
+
+    def interrupt(self):
+        """Wake every transfer waiting for a slot, so that cancelled ones
+        give up (see AdaptiveLimit.acquire)."""
+        with self._lock:
+            limits = list(self._limits.values())
+        for limit in limits:
+            limit.interrupt()
+
+    @contextmanager
+    def slot(self, host, size=None, priority=0, deadline=None,
+             cancelled=None):
+        """Run a transfer to a host within its concurrency limit.
+
+        Blocks until the host has a free slot, and no more urgent transfer
+        is waiting for one (see AdaptiveLimit.acquire). The transfer counts
+        as failed unless it calls succeed() on the yielded Slot. If it calls
+        discard() instead, or was cancelled meanwhile, the limit is left as
+        it was.
+
+        :param host: Name of the host.
+        :type host: str
+        :param size: Number of bytes to transfer, if known up front.
+        :type size: int
+        :param priority: Higher priorities get a slot first.
+        :type priority: int
+        :param deadline: Time by which the transfer must be done, or None.
+        :type deadline: float
+        :param cancelled: Event set once the transfer is no longer wanted.
+        :type cancelled: threading.Event
+        :raises: Cancelled
+        """
+        limit = self.limit(host)
+        slot = Slot()
+        limit.acquire(priority, deadline, cancelled)
+        start = time.time()
+        try:
+            yield slot
+        finally:
+            if not slot.success and (slot.discarded or cancelled is not None
+                                     and cancelled.is_set()):
+                limit.abandon()
+            else:
+                limit.release(slot.success, slot.size or size,
+                              time.time() - start)
@@ -0,0 +1,332 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Storj Labs
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import json
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.request import Request, urlopen
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urllib2 import Request, urlopen
+
+from . import settings
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+class LocalCoordinator(object):
+
+    """Reference coordinator, keeping host health and load in memory.
+
+    Every host has an error count, a circuit and a count of transfers in
+    flight. The circuit opens after a number of consecutive errors, turns
+    half-open once a cooldown has passed, and closes again on the next
+    successful transfer.
+
+    Transfers in flight are counted for this process (begin and end), and
+    for other nodes from the absolute counts they report. A node's report
+    only holds for a lease, so the transfers of a node that stops
+    reporting are forgotten instead of counting forever.
+    """
+
+    def __init__(self, threshold=settings.CIRCUIT_ERROR_THRESHOLD,
+                 cooldown=settings.CIRCUIT_COOLDOWN,
+                 lease=settings.COORDINATOR_LEASE):
+        """Initialize the coordinator with no known hosts.
+
+        :param threshold: Consecutive errors that open a host's circuit.
+        :type threshold: int
+        :param cooldown: Seconds before an open circuit turns half-open.
+        :type cooldown: float
+        :param lease: Seconds a node's report holds for.
+        :type lease: float
+        """
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.lease = lease
+        self._hosts = defaultdict(lambda: {
+            'errors': 0, 'consecutive_errors': 0, 'opened_at': None})
+        self._in_flight = defaultdict(int)
+        self._nodes = {}
+        self._lock = threading.Lock()
+
+    def _circuit(self, state):
+        if state['opened_at'] is None:
+            return CLOSED
+        if time.time() - state['opened_at'] < self.cooldown:
+            return OPEN
+        return HALF_OPEN
+
+    def begin(self, host):
+        """Record the start of a transfer to a host.
+
+        :param host: Name of the host.
+        :type host: str
+        """
+        with self._lock:
+            self._in_flight[host] += 1
+
+    def end(self, host, success):
+        """Record the end and outcome of a transfer to a host.
+
+        :param host: Name of the host.
+        :type host: str
+        :param success: Whether the transfer succeeded, or None if it was
+                        cancelled and has no outcome.
+        :type success: bool
+        """
+        with self._lock:
+            self._in_flight[host] = max(0, self._in_flight[host] - 1)
+        self.record(host, success)
+
+    def record(self, host, success):
+        """Record the outcome of a transfer to a host, made by any node.
+
+        :param host: Name of the host.
+        :type host: str
+        :param success: Whether the transfer succeeded, or None if it was
+                        cancelled and has no outcome.
+        :type success: bool
+        """
+        if success is None:
+            return
+        with self._lock:
+            state = self._hosts[host]
+            if success:
+                state['consecutive_errors'] = 0
+                state['opened_at'] = None
+                return
+            state['errors'] += 1
+            state['consecutive_errors'] += 1
+            if state['consecutive_errors'] >= self.threshold and \
+                    self._circuit(state) != OPEN:
+                state['opened_at'] = time.time()
+
+    def report(self, node, in_flight):
+        """Replace the transfers in flight of another node.
+
+        :param node: Identifier of the node.
+        :type node: str
+        :param in_flight: Dict of host name to the node's transfers in
+                          flight to that host.
+        :type in_flight: dict
+        """
+        with self._lock:
+            self._nodes[node] = (time.time() + self.lease, dict(in_flight))
+
+    def snapshot(self):
+        """Return the health and load of every known host.
+
+        :returns: Dict of host name to a dict with 'errors', 'circuit' and
+                  'in_flight' keys.
+        :rtype: dict
+        """
+        with self._lock:
+            now = time.time()
+            for node, (expires_at, _) in list(self._nodes.items()):
+                if expires_at <= now:
+                    del self._nodes[node]
+
+            in_flight = defaultdict(int, self._in_flight)
+            for _, counts in self._nodes.values():
+                for host, count in counts.items():
+                    in_flight[host] += count
+            for host in in_flight:
+                self._hosts[host]
+            return dict((host, {'errors': state['errors'],
+                                'circuit': self._circuit(state),
+                                'in_flight': in_flight[host]})
+                        for host, state in self._hosts.items())
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path != '/hosts':
+            return self.send_error(404)
+        self._reply(self.server.coordinator.snapshot())
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        try:
+            body = json.loads(self.rfile.read(length).decode('utf-8'))
+            if self.path == '/end':
+                self.server.coordinator.record(body['host'], body['success'])
+            elif self.path != '/report':
+                return self.send_error(404)
+            self.server.coordinator.report(body['node'], body['in_flight'])
+        except (ValueError, KeyError):
+            return self.send_error(400)
+        self._reply({})
+
+    def _reply(self, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class CoordinatorServer(ThreadingMixIn, HTTPServer):
+
+    """Small HTTP service sharing a LocalCoordinator between nodes.
+
+    Nodes report their transfers in flight with POST /report, along with
+    the outcome of a transfer with POST /end, and read the state of every
+    host with GET /hosts, all in JSON.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, coordinator=None):
+        """Bind the server to the given address.
+
+        :param address: (host, port) tuple to listen on.
+        :type address: tuple
+        :param coordinator: Coordinator holding the shared state.
+        :type coordinator: LocalCoordinator
+        """
+        HTTPServer.__init__(self, address, _Handler)
+        self.coordinator = coordinator or LocalCoordinator()
+
+
+class RemoteCoordinator(object):
+
+    """Client of a CoordinatorServer that degrades to local state.
+
+    Every transfer is also recorded in a LocalCoordinator. Whenever the
+    server cannot be reached, that node-local state is used instead, and
+    the server is left alone for a while before being tried again.
+
+    The node's transfers in flight are sent whole with every report, and
+    again on a heartbeat while any are running or the last report was
+    missed, so the server's counts heal after a lost request.
+    """
+
+    def __init__(self, url, timeout=settings.COORDINATOR_TIMEOUT,
+                 retry=settings.COORDINATOR_RETRY, node=None,
+                 heartbeat=settings.COORDINATOR_HEARTBEAT):
+        """Initialize the client and start its heartbeat.
+
+        :param url: Base URL of the coordinator server.
+        :type url: str
+        :param timeout: Seconds to wait for the server on each request.
+        :type timeout: float
+        :param retry: Seconds to wait before retrying an unreachable server.
+        :type retry: float
+        :param node: Identifier of this node, random by default.
+        :type node: str
+        :param heartbeat: Seconds between heartbeats, shorter than the
+                          server's lease.
+        :type heartbeat: float
+        """
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        self.retry = retry
+        self.node = node or uuid.uuid4().hex
+        self.heartbeat = heartbeat
+        self.local = LocalCoordinator()
+        self._unreachable_until = 0
+        self._snapshot, self._snapshot_at = None, 0
+        self._reported = {}
+        self._closed = threading.Event()
+        thread = threading.Thread(target=self._beat)
+        thread.daemon = True
+        thread.start()
+
+    def _request(self, path, payload=None):
+        if time.time() < self._unreachable_until:
+            return None
+        data = None if payload is None else \
+            json.dumps(payload).encode('utf-8')
+        request = Request(self.url + path, data,
+                          {'Content-Type': 'application/json'})
+        try:
+            response = urlopen(request, timeout=self.timeout)
+            try:
+                return json.loads(response.read().decode('utf-8'))
+            finally:
+                response.close()
+        except Exception:
+            self._unreachable_until = time.time() + self.retry
+            return None
+
+    def _in_flight(self):
+        return dict((host, state['in_flight'])
+                    for host, state in self.local.snapshot().items()
+                    if state['in_flight'])
+
+    def _report(self, path='/report', **payload):
+        in_flight = self._in_flight()
+        payload.update(node=self.node, in_flight=in_flight)
+        if self._request(path, payload) is not None:
+            self._reported = in_flight
+
+    def _beat(self):
+        while not self._closed.wait(self.heartbeat):
+            if self._reported or self._in_flight():
+                self._report()
+
+    def begin(self, host):
+        """Record the start of a transfer (see LocalCoordinator.begin)."""
+        self.local.begin(host)
+        self._report()
+
+    def end(self, host, success):
+        """Record a transfer outcome (see LocalCoordinator.end)."""
+        self.local.end(host, success)
+        self._report('/end', host=host, success=success)
+
+    def close(self):
+        """Stop the heartbeat."""
+        self._closed.set()
+
+    def snapshot(self):
+        """Return the cluster-wide host state, or the local one if the
+        server cannot be reached (see LocalCoordinator.snapshot).
+
+        The cluster-wide state is cached for a short while, as it is read
+        every time hosts are selected.
+        """
+        if time.time() - self._snapshot_at < settings.COORDINATOR_CACHE_TTL:
+            return self._snapshot
+        snapshot = self._request('/hosts')
+        if snapshot is None:
+            return self.local.snapshot()
+        self._snapshot, self._snapshot_at = snapshot, time.time()
+        return snapshot
@@ -23,6 +23,129 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+import json
+
+
+class Host(object):
+
+    """Capabilities and limits of a plowshare host module.
+
+    Limits left as None are unknown, and never rule the host out.
+    """
+
+    def __init__(self, name, max_file_size=None, max_concurrency=None,
+                 retention=None, supports_range=None, weight=1.0):
+        """Initialize the host with its known limits.
+
+        :param name: Name of the plowshare module.
+        :type name: str
+        :param max_file_size: Largest file the host accepts, in bytes.
+        :type max_file_size: int
+        :param max_concurrency: Most simultaneous transfers the host allows.
+        :type max_concurrency: int
+        :param retention: Seconds an uploaded file is kept without downloads.
+        :type retention: int
+        :param supports_range: Whether direct links serve byte ranges.
+        :type supports_range: bool
+        :param weight: Relative share of files placed on the host.
+        :type weight: float
+        """
+        self.name = name
+        self.max_file_size = max_file_size
+        self.max_concurrency = max_concurrency
+        self.retention = retention
+        self.supports_range = supports_range
+        self.weight = weight
+
+    def __repr__(self):
+        return 'Host(%r)' % self.name
+
+    def accepts(self, size):
+        """Check whether the host accepts a file of the given size.
+
+        :param size: Size of the file in bytes, or None if unknown.
+        :type size: int
+        :rtype: bool
+        """
+        return size is None or self.max_file_size is None or \
+            size <= self.max_file_size
+
+
+class HostRegistry(object):
+
+    """Lookup of host capabilities by plowshare module name."""
+
+    def __init__(self, hosts=()):
+        """Initialize the registry with the given hosts.
+
+        :param hosts: Host instances to register.
+        :type hosts: list
+        """
+        self._hosts = dict((host.name, host) for host in hosts)
+
+    @classmethod
+    def from_dict(cls, config):
+        """Build a registry from a mapping of host names to limits.
+
+        >>> HostRegistry.from_dict({'rghost': {'max_file_size': 100}})[
+        ...     'rghost'].max_file_size
+        100
+
+        :param config: Dict of host name to a dict of Host keyword arguments.
+        :type config: dict
+        :rtype: HostRegistry
+        """
+        return cls(Host(name, **limits) for name, limits in config.items())
+
+    @classmethod
+    def from_file(cls, filename):
+        """Build a registry from a JSON config file (see from_dict).
+
+        :param filename: Path of the JSON config file.
+        :type filename: str
+        :rtype: HostRegistry
+        """
+        with open(filename) as f:
+            return cls.from_dict(json.load(f))
+
+    def __contains__(self, name):
+        return name in self._hosts
+
+    def __getitem__(self, name):
+        """Return the capabilities of a host, unknown ones included."""
+        return self._hosts.get(name) or Host(name)
+
+    def add(self, host):
+        """Register a host, replacing any previous entry with its name.
+
+        :param host: The host to register.
+        :type host: Host
+        """
+        self._hosts[host.name] = host
+
+    def eligible(self, names, size=None):
+        """Filter host names down to those that accept a file.
+
+        :param names: List of host names.
+        :type names: list
+        :param size: Size of the file in bytes, or None if unknown.
+        :type size: int
+        :returns: The host names that accept the file, in the same order.
+        :rtype: list
+        """
+        return [name for name in names if self[name].accepts(size)]
+
+    def weights(self, names):
+        """Return the placement weight of each of the given hosts.
+
+        :param names: List of host names.
+        :type names: list
+        :returns: Dict of host name to weight.
+        :rtype: dict
+        """
+        return dict((name, self[name].weight) for name in names)
+
+
 anonymous = [
     'euroshare_eu',
     'ge_tt',
@@ -31,3 +154,7 @@ anonymous = [
     'rghost',
     'zalil_ru'
 ]
+
+# Capabilities of the anonymous hosts. Limits that have not been measured
+# are left unknown; load a HostRegistry from a config file to set them.
+registry = HostRegistry(Host(name) for name in anonymous)
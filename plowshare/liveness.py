@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Storj Labs
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import subprocess
+import threading
+import time
+from collections import OrderedDict
+from itertools import islice
+
+# Same as multiprocessing, but thread only.
+import multiprocessing.dummy
+
+try:
+    from urllib.request import Request, urlopen
+    from urllib.error import HTTPError
+except ImportError:
+    from urllib2 import Request, urlopen, HTTPError
+
+from . import settings
+
+# Exit status plowprobe uses for links that no longer exist.
+ERR_LINK_DEAD = 13
+
+
+def plowprobe(source):
+    """Check whether a source is alive with plowprobe.
+
+    :param source: Dict with 'host_name' and 'url' keys.
+    :type source: dict
+    :returns: True if alive, False if dead, None if it could not be told.
+    :rtype: bool
+    """
+    try:
+        subprocess.check_output(
+            ["plowprobe", source['url']], stderr=open("/dev/null", "w"))
+        return True
+    except subprocess.CalledProcessError as e:
+        return False if e.returncode == ERR_LINK_DEAD else None
+    except OSError:
+        return None
+
+
+def head(source):
+    """Check whether a source is alive with a plain HTTP HEAD request.
+
+    Much cheaper than plowprobe, but only meaningful for hosts whose
+    download pages answer with an error status once a file is gone.
+
+    :param source: Dict with 'host_name' and 'url' keys.
+    :type source: dict
+    :returns: True if alive, False if dead, None if it could not be told.
+    :rtype: bool
+    """
+    request = Request(source['url'])
+    request.get_method = lambda: 'HEAD'
+    try:
+        urlopen(request, timeout=settings.PROBE_TIMEOUT).close()
+        return True
+    except HTTPError as e:
+        return False if e.code in (404, 410) else None
+    except Exception:
+        return None
+
+
+class LivenessCache(object):
+
+    """Thread-safe cache of source liveness by URL, with a time to live.
+
+    Entries are kept in the order they expire in. Expired entries are
+    purged as new ones are recorded, and the entries closest to expiring
+    make room once the cache is full, so memory stays bounded however many
+    sources are probed.
+    """
+
+    def __init__(self, ttl=settings.LIVENESS_TTL,
+                 max_size=settings.LIVENESS_CACHE_SIZE):
+        """Initialize an empty cache.
+
+        :param ttl: Seconds a probe result stays valid.
+        :type ttl: float
+        :param max_size: Most results kept at once.
+        :type max_size: int
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, url):
+        """Return the cached liveness of a URL.
+
+        :param url: The source URL.
+        :type url: str
+        :returns: True or False, or None if unknown or expired.
+        :rtype: bool
+        """
+        with self._lock:
+            alive, expires = self._entries.get(url, (None, 0))
+            if expires < time.time():
+                self._entries.pop(url, None)
+                return None
+            return alive
+
+    def set(self, url, alive):
+        """Record the liveness of a URL. Unknown results are not cached.
+
+        :param url: The source URL.
+        :type url: str
+        :param alive: Result of the probe.
+        :type alive: bool
+        """
+        if alive is None:
+            return
+        with self._lock:
+            now = time.time()
+            self._entries.pop(url, None)
+            self._entries[url] = (alive, now + self.ttl)
+            while self._entries:
+                oldest = next(iter(self._entries))
+                if len(self._entries) <= self.max_size and \
+                        self._entries[oldest][1] >= now:
+                    break
+                del self._entries[oldest]
+
+
+class HostRateLimiter(object):
+
+    """Space out requests to each host by a minimum interval."""
+
+    def __init__(self, rate=settings.PROBE_RATE):
+        """Initialize the limiter.
+
+        :param rate: Most requests per second to a single host.
+        :type rate: float
+        """
+        self.interval = 1.0 / rate
+        self._next = {}
+        self._lock = threading.Lock()
+
+    def wait(self, host):
+        """Block until a request to the given host is allowed.
+
+        :param host: Name of the host.
+        :type host: str
+        """
+        with self._lock:
+            now = time.time()
+            slot = max(now, self._next.get(host, now))
+            self._next[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class LivenessProber(object):
+
+    """Probe large sets of sources concurrently, caching the results."""
+
+    def __init__(self, backend=plowprobe, cache=None,
+                 workers=settings.PROBE_WORKERS, rate=settings.PROBE_RATE):
+        """Initialize the prober.
+
+        :param backend: Function taking a source and returning its liveness,
+                        such as plowprobe or head.
+        :type backend: function
+        :param cache: Cache to read from and store results in.
+        :type cache: LivenessCache
+        :param workers: Number of probes running at once.
+        :type workers: int
+        :param rate: Most probes per second to a single host.
+        :type rate: float
+        """
+        self.backend = backend
+        self.cache = cache if cache is not None else LivenessCache()
+        self.workers = workers
+        self.limiter = HostRateLimiter(rate)
+
+    def _probe(self, source):
+        alive = self.cache.get(source['url'])
+        if alive is None:
+            self.limiter.wait(source['host_name'])
+            alive = self.backend(source)
+            self.cache.set(source['url'], alive)
+        return source, alive
+
+    def iprobe(self, sources):
+        """Probe sources lazily, in batches, yielding results in order.
+
+        Only one batch of sources is held in memory at a time, so this can
+        go through millions of stored sources. Cached results are reused
+        without probing again.
+
+        :param sources: Iterable of dicts with 'host_name' and 'url' keys.
+        :type sources: iterable
+        :returns: Iterator of (source, alive) tuples, alive being True,
+                  False or None.
+        :rtype: iterator
+        """
+        sources = iter(sources)
+        pool = multiprocessing.dummy.Pool(self.workers)
+        try:
+            while True:
+                batch = list(islice(sources, settings.PROBE_BATCH_SIZE))
+                if not batch:
+                    break
+                for result in pool.map(self._probe, batch):
+                    yield result
+        finally:
+            pool.close()
+
+    def probe(self, sources):
+        """Probe sources, returning their liveness.
+
+        :param sources: Iterable of dicts with 'host_name' and 'url' keys.
+        :type sources: iterable
+        :returns: List of (source, alive) tuples.
+        :rtype: list
+        """
+        return list(self.iprobe(sources))
@@ -0,0 +1,246 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Storj Labs
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from . import compression
+from . import settings
+from . import store
+
+
+def prepare(filename, directory, compress=True):
+    """Hash a file and, if it pays off, compress it ahead of its upload.
+
+    Runs in a worker process, so it has to be a module-level function.
+
+    :param filename: The filename of the file to prepare.
+    :type filename: str
+    :param directory: Directory to write the compressed copy under.
+    :type directory: str
+    :param compress: Whether to try compressing the file.
+    :type compress: bool
+    :returns: A dict with the 'filename', its content 'hash' and 'size',
+              the 'payload' filename to upload and, if compressed, the
+              'codec'. On failure, a dict with the 'filename' and an
+              'error' instead.
+    :rtype: dict
+    """
+    try:
+        prepared = {'filename': filename, 'payload': filename,
+                    'hash': store.content_hash(filename),
+                    'size': os.path.getsize(filename)}
+        codec = compression.choose_codec(filename) if compress else None
+        if codec is not None:
+            prepared['payload'] = os.path.join(
+                tempfile.mkdtemp(dir=directory),
+                os.path.basename(filename) + '.' + codec[0])
+            prepared['codec'] = codec[0]
+            compression.compress_file(filename, prepared['payload'], *codec)
+        return prepared
+    except Exception as e:
+        return {'filename': filename, 'error': str(e)}
+
+
+def _prepare(prepare, filename, directory, compress):
+    try:
+        return prepare(filename, directory, compress)
+    except Exception as e:
+        return {'filename': filename, 'error': str(e)}
+
+
+class Pipeline(object):
+
+    """Prepare files on every core while earlier ones are being uploaded.
+
+    Files go through two stages: preparation (hashing and compressing) in
+    a process pool, and upload on a set of transfer threads. A bounded
+    number of files is in the pipeline at any time, so a slow stage holds
+    back the other one instead of piling up prepared files.
+    """
+
+    def __init__(self, plowshare, processes=None,
+                 transfers=settings.PIPELINE_TRANSFERS,
+                 size=settings.PIPELINE_SIZE, compress=True,
+                 prepare=prepare):
+        """Initialize the pipeline.
+
+        :param plowshare: Instance used to upload the prepared files.
+        :type plowshare: Plowshare
+        :param processes: Number of preparation processes, defaulting to
+                          the number of cores.
+        :type processes: int
+        :param transfers: Number of files uploaded at once.
+        :type transfers: int
+        :param size: Most files being prepared, waiting, or uploaded at once.
+        :type size: int
+        :param compress: Whether to try compressing the files.
+        :type compress: bool
+        :param prepare: Module-level function preparing a file, with the
+                        same signature and result as prepare.
+        :type prepare: function
+        """
+        self.plowshare = plowshare
+        self.processes = processes
+        self.transfers = transfers
+        self.size = size
+        self.compress = compress
+        self.prepare = prepare
+
+    def upload(self, filenames, number_of_hosts):
+        """Prepare and upload files, yielding their manifests as they finish.
+
+        :param filenames: Iterable of filenames to upload.
+        :type filenames: iterable
+        :param number_of_hosts: The number of hosts to upload each file to.
+        :type number_of_hosts: int
+        :returns: Iterator of manifests, in completion order, with the
+                  'filename', content 'hash', 'size', and 'sources' (with
+                  the 'codec' if compressed), or an 'error'.
+        :rtype: iterator
+        :raises: Whatever iterating over filenames raises, once the files
+                 read before are done.
+
+        If the iterator is closed early, files not yet uploaded are
+        dropped. Uploads already running finish in the background before
+        the prepared files are removed.
+        """
+        slots = threading.BoundedSemaphore(self.size)
+        stopped = threading.Event()
+        ready, results = queue.Queue(), queue.Queue()
+        directory = tempfile.mkdtemp()
+        pool = multiprocessing.Pool(self.processes)
+
+        def failed(filename):
+            return lambda e: ready.put({'filename': filename,
+                                        'error': str(e)})
+
+        def feed():
+            count, error = 0, None
+            try:
+                for filename in filenames:
+                    slots.acquire()
+                    if stopped.is_set():
+                        break
+                    callbacks = {'callback': ready.put}
+                    # Python 2 pools have no error_callback, and lose
+                    # tasks that cannot be sent to a worker
+                    if sys.version_info[0] > 2:
+                        callbacks['error_callback'] = failed(filename)
+                    pool.apply_async(_prepare, (
+                        self.prepare, filename, directory, self.compress),
+                        **callbacks)
+                    count += 1
+            except Exception as e:
+                error = e
+            finally:
+                results.put((count, error))
+
+        def transfer():
+            for prepared in iter(ready.get, None):
+                try:
+                    if stopped.is_set():
+                        continue
+                    results.put(self._upload(prepared, number_of_hosts))
+                except Exception as e:
+                    results.put({'filename': prepared['filename'],
+                                 'error': str(e)})
+                finally:
+                    slots.release()
+
+        transfers = [threading.Thread(target=transfer)
+                     for _ in range(self.transfers)]
+        for thread in [threading.Thread(target=feed)] + transfers:
+            thread.daemon = True
+            thread.start()
+
+        def clean_up():
+            for thread in transfers:
+                thread.join()
+            shutil.rmtree(directory, ignore_errors=True)
+
+        done, total, error = 0, None, None
+        try:
+            while total is None or done < total:
+                result = results.get()
+                if isinstance(result, tuple):
+                    total, error = result
+                    continue
+                done += 1
+                yield result
+            if error is not None:
+                raise error
+        finally:
+            finished = total is not None and done == total
+            stopped.set()
+            pool.terminate()
+            pool.join()
+            # Give back the slots of dropped files, and one more to wake
+            # the feeder if it waits for a slot
+            while True:
+                try:
+                    ready.get_nowait()
+                except queue.Empty:
+                    break
+                slots.release()
+            try:
+                slots.release()
+            except ValueError:
+                pass
+            for _ in transfers:
+                ready.put(None)
+
+            if finished:
+                clean_up()
+            else:
+                thread = threading.Thread(target=clean_up)
+                thread.daemon = True
+                thread.start()
+
+    def _upload(self, prepared, number_of_hosts):
+        if 'error' in prepared:
+            return prepared
+        try:
+            sources = self.plowshare._upload_with_spares(
+                prepared['payload'], number_of_hosts)
+        finally:
+            if prepared['payload'] != prepared['filename']:
+                shutil.rmtree(os.path.dirname(prepared['payload']),
+                              ignore_errors=True)
+
+        if 'codec' in prepared:
+            for source in sources:
+                source['codec'] = prepared['codec']
+        return {'filename': prepared['filename'], 'hash': prepared['hash'],
+                'size': prepared['size'], 'sources': sources}
@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Storj Labs
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import binascii
+import errno
+import os
+import shutil
+
+# Size of each zero-copy (or buffered) copy call when moving across devices.
+COPY_BLOCK_SIZE = 8 * 1024 * 1024
+
+
+def temporary_path(destination):
+    """Pick a hidden temporary path next to the given destination.
+
+    Being in the same directory, the temporary file lives on the same
+    filesystem, so it can later be renamed over the destination atomically.
+
+    :param destination: Final path of the file.
+    :type destination: str
+    :returns: Path of a temporary file in the destination's directory.
+    :rtype: str
+    """
+    directory, name = os.path.split(destination)
+    suffix = binascii.hexlify(os.urandom(4)).decode('ascii')
+    return os.path.join(directory, '.%s.%s.part' % (name, suffix))
+
+
+def preallocate(fd, size):
+    """Reserve disk space for a file of the given size.
+
+    Uses fallocate where the platform and filesystem support it, so large
+    files are laid out contiguously, and falls back to extending the file.
+
+    :param fd: File descriptor opened for writing.
+    :type fd: int
+    :param size: Size of the file in bytes.
+    :type size: int
+    """
+    if size and hasattr(os, 'posix_fallocate'):
+        try:
+            os.posix_fallocate(fd, 0, size)
+            return
+        except OSError as e:
+            if e.errno not in (errno.EOPNOTSUPP, errno.EINVAL, errno.ENOSYS):
+                raise
+    os.ftruncate(fd, size)
+
+
+def copy_file(source_fd, destination_fd, size):
+    """Copy the contents of one open file into another.
+
+    The copy stays in the kernel using copy_file_range or sendfile when
+    available, and falls back to a buffered copy otherwise, or when they
+    stop short of the given size.
+
+    :param source_fd: File descriptor opened for reading.
+    :type source_fd: int
+    :param destination_fd: File descriptor opened for writing.
+    :type destination_fd: int
+    :param size: Number of bytes to copy.
+    :type size: int
+    :raises: IOError if the source holds fewer bytes than size.
+    """
+    for name in ('copy_file_range', 'sendfile'):
+        if not hasattr(os, name):
+            continue
+        try:
+            offset = 0
+            while offset < size:
+                if name == 'copy_file_range':
+                    copied = os.copy_file_range(
+                        source_fd, destination_fd,
+                        min(COPY_BLOCK_SIZE, size - offset), offset, offset)
+                else:
+                    os.lseek(destination_fd, offset, os.SEEK_SET)
+                    copied = os.sendfile(
+                        destination_fd, source_fd, offset,
+                        min(COPY_BLOCK_SIZE, size - offset))
+                if not copied:
+                    break
+                offset += copied
+            if offset >= size:
+                return
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.EINVAL, errno.ENOSYS,
+                               errno.EOPNOTSUPP):
+                raise
+
+    os.lseek(source_fd, 0, os.SEEK_SET)
+    os.lseek(destination_fd, 0, os.SEEK_SET)
+    with os.fdopen(os.dup(source_fd), 'rb') as src, \
+            os.fdopen(os.dup(destination_fd), 'wb') as dst:
+        shutil.copyfileobj(src, dst, COPY_BLOCK_SIZE)
+        copied = dst.tell()
+    if copied < size:
+        raise IOError(errno.EIO, 'Copied %d of %d bytes' % (copied, size))
+
+
+def move(source, destination):
+    """Move a file into place atomically.
+
+    A plain rename is used whenever possible. When the source lives on
+    another filesystem, the file is copied next to the destination first
+    and then renamed over it, so the destination never holds a partial
+    file. On failure the destination is left untouched.
+
+    :param source: Path of the file to move.
+    :type source: str
+    :param destination: Final path of the file.
+    :type destination: str
+    """
+    try:
+        os.rename(source, destination)
+        return
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+
+    with open(source, 'rb') as src:
+        size = os.fstat(src.fileno()).st_size
+        with Placement(destination, size) as placement:
+            copy_file(src.fileno(), placement.fd, size)
+            placement.commit()
+    os.remove(source)
+
+
+class Placement(object):
+
+    """Write a file under a temporary name and place it atomically.
+
+    Used as a context manager, the temporary file is created next to the
+    destination and preallocated to the expected size. It only replaces
+    the destination when commit() is called, and is removed otherwise.
+    """
+
+    def __init__(self, destination, size=None):
+        """Initialize the placement of the given destination.
+
+        :param destination: Final path of the file.
+        :type destination: str
+        :param size: Expected size in bytes, used to preallocate the file.
+        :type size: int
+        """
+        self.destination = destination
+        self.size = size
+        self.path = temporary_path(destination)
+        self.fd = None
+        self._committed = False
+
+    def __enter__(self):
+        self.fd = os.open(
+            self.path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        try:
+            if self.size:
+                preallocate(self.fd, self.size)
+        except Exception:
+            self.abort()
+            raise
+        return self
+
+    def __exit__(self, *exc_info):
+        if not self._committed:
+            self.abort()
+
+    def commit(self):
+        """Close the temporary file and rename it over the destination."""
+        try:
+            os.close(self.fd)
+            self.fd = None
+            os.rename(self.path, self.destination)
+        except Exception:
+            self.abort()
+            raise
+        self._committed = True
+
+    def abort(self):
+        """Close and remove the temporary file."""
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
@@ -25,30 +25,81 @@
 
 import os
 import random
+import shutil
 import subprocess
+import tempfile
+import threading
+import time
 from collections import defaultdict
+from contextlib import contextmanager
 
 # Same as multiprocessing, but thread only.
 # We don't need to spawn new processes for this.
 import multiprocessing.dummy
 from multiprocessing import Manager
 
+from . import bundle
+from . import compression
+from . import concurrency
+from . import coordination
 from . import hosts
+from . import liveness
+from . import placement
+from . import rendezvous
+from . import scheduler
 from . import settings
+from . import store
+from . import swarm
 
 
 class Plowshare(object):
 
     """Upload and download files using the plowshare tool."""
 
-    def __init__(self, host_list=hosts.anonymous):
+    def __init__(self, host_list=hosts.anonymous, registry=hosts.registry,
+                 controller=None, liveness_cache=None, coordinator=None,
+                 transfer_scheduler=None):
         """Initialize Plowshare with the supplied hosts list.
 
         :param host_list: List of potential hosts to upload to.
         :type host_list: list
+        :param registry: Capabilities and limits of the hosts.
+        :type registry: hosts.HostRegistry
+        :param controller: Per-host concurrency limits shared by every
+                           transfer. Pass the same controller to several
+                           instances to share the limits between them.
+        :type controller: concurrency.ConcurrencyController
+        :param liveness_cache: Cached results of source liveness probes.
+        :type liveness_cache: liveness.LivenessCache
+        :param coordinator: Shares host health and load with other nodes,
+                            such as a coordination.RemoteCoordinator.
+        :type coordinator: coordination.LocalCoordinator
+        :param transfer_scheduler: Runs the transfers submitted with
+                                   schedule_upload and schedule_download.
+        :type transfer_scheduler: scheduler.Scheduler
         """
         self.hosts = host_list
+        self.registry = registry
+        self.concurrency = controller or \
+            concurrency.ConcurrencyController(registry)
+        self.liveness = liveness_cache if liveness_cache is not None else \
+            liveness.LivenessCache()
+        self.coordinator = coordinator
+        self.scheduler = transfer_scheduler or scheduler.Scheduler()
         self._host_errors = defaultdict(int)
+        self._local = threading.local()
+
+    def _file_size(self, filename):
+        """Return the size of a file, or None if it cannot be read.
+
+        :param filename: The filename of the file.
+        :type filename: str
+        :rtype: int
+        """
+        try:
+            return os.path.getsize(filename)
+        except OSError:
+            return None
 
     def _run_command(self, command, **kwargs):
         """Wrapper to pass command to plowshare.
@@ -67,64 +118,499 @@ class Plowshare(object):
         except Exception as e:
             return {'error': str(e)}
 
+    @contextmanager
+    def _slot(self, host, size=None):
+        """Run a transfer within the host's concurrency limit.
+
+        The transfer is also reported to the coordinator, if any. Once the
+        current thread's transfers are cancelled (see replicate), waiting
+        for the slot raises concurrency.Cancelled, and failures no longer
+        count against the host, as is the case for discarded failures.
+
+        :param host: Name of the host.
+        :type host: str
+        :param size: Number of bytes to transfer, if known up front.
+        :type size: int
+        """
+        cancelled = getattr(self._local, 'cancelled', None)
+        with self.concurrency.slot(host, size, *self._current_urgency(),
+                                   cancelled=cancelled) as slot:
+            if self.coordinator is None:
+                yield slot
+                return
+            self.coordinator.begin(host)
+            try:
+                yield slot
+            finally:
+                self.coordinator.end(host, slot.success or (
+                    None if slot.discarded or cancelled is not None and
+                    cancelled.is_set() else False))
+
+    @contextmanager
+    def _urgency(self, priority, deadline):
+        """Give the transfers of the current thread a priority and deadline.
+
+        They apply to every slot the thread takes (see _slot), and are
+        passed on to the threads it starts through _carry_urgency.
+
+        :param priority: Higher priorities get host slots first.
+        :type priority: int
+        :param deadline: Time by which the transfers must be done, or None.
+        :type deadline: float
+        """
+        previous = self._current_urgency()
+        self._local.urgency = (priority, deadline)
+        try:
+            yield
+        finally:
+            self._local.urgency = previous
+
+    def _current_urgency(self):
+        return getattr(self._local, 'urgency', (0, None))
+
+    def _carry_urgency(self, function):
+        """Wrap a function to run with the current thread's urgency.
+
+        :param function: Function to run on another thread.
+        :type function: function
+        :rtype: function
+        """
+        urgency = self._current_urgency()
+
+        def carried(*args):
+            with self._urgency(*urgency):
+                return function(*args)
+        return carried
+
+    def _cluster_state(self):
+        """Return the cluster-wide state of every host.
+
+        :returns: Dict of host name to a dict with 'errors', 'circuit' and
+                  'in_flight' keys, empty without a coordinator.
+        :rtype: dict
+        """
+        if self.coordinator is None:
+            return {}
+        return self.coordinator.snapshot()
+
     def _hosts_by_success(self, hosts=[]):
         """Order hosts by most successful (least amount of errors) first.
 
+        With a coordinator, hosts whose circuit is open come last, errors
+        seen by any node count, and ties go to the least loaded host.
+
         :param hosts: List of hosts.
         :type hosts: list
         :returns: List of hosts sorted by successful connections.
         :rtype: list
         """
         hosts = hosts if hosts else self.hosts
-        return sorted(hosts, key=lambda h: self._host_errors[h])
+        state = self._cluster_state()
+
+        def key(host):
+            cluster = state.get(host, {})
+            return (cluster.get('circuit') == coordination.OPEN,
+                    max(self._host_errors[host], cluster.get('errors', 0)),
+                    cluster.get('in_flight', 0))
+
+        return sorted(hosts, key=key)
+
+    def _hosts_by_speed(self, hosts):
+        """Order hosts by measured transfer rate, fastest first.
+
+        Hosts without a measured rate come last, ordered by success.
+
+        :param hosts: List of hosts.
+        :type hosts: list
+        :rtype: list
+        """
+        return sorted(self._hosts_by_success(hosts) if hosts else [],
+                      key=lambda h: -(self.concurrency.rate(h) or 0))
+
+    def _estimate(self, hosts, size, copies=1):
+        """Estimate how long transferring a file to or from hosts takes.
+
+        :param hosts: List of hosts the transfer may use.
+        :type hosts: list
+        :param size: Size of the file in bytes, or None if unknown.
+        :type size: int
+        :param copies: Number of hosts the transfer needs to complete on.
+        :type copies: int
+        :returns: Seconds until the fastest hosts are done, or None if not
+                  enough of them have a measured rate.
+        :rtype: float
+        """
+        if not size:
+            return None
+        rates = [self.concurrency.rate(host) for host in hosts]
+        durations = sorted(size / rate for rate in rates if rate)
+        if len(durations) < copies:
+            return None
+        return durations[copies - 1]
 
     def _filter_sources(self, sources):
         """Remove sources with errors and return ordered by host success.
 
+        Sources last probed dead are removed as well, and sources probed
+        alive come before those that were not probed. Among the latter,
+        sources whose 'uploaded_at' time is older than the retention of
+        their host come last, as the host has probably dropped the file.
+
         :param sources: List of potential sources to connect to.
         :type sources: list
         :returns: Sorted list of potential sources without errors.
         :rtype: list
         """
-        filtered, hosts = [], []
+        filtered, hosts, alive = [], [], {}
         for source in sources:
             if 'error' in source:
                 continue
+            alive[source['url']] = self.liveness.get(source['url'])
+            if alive[source['url']] is False:
+                continue
             filtered.append(source)
             hosts.append(source['host_name'])
 
-        return sorted(filtered, key=lambda s:
-                      self._hosts_by_success(hosts).index(s['host_name']))
+        now = time.time()
+
+        def expired(source):
+            retention = self.registry[source['host_name']].retention
+            return retention is not None and \
+                source.get('uploaded_at', now) + retention < now
+
+        ranking = self._hosts_by_success(hosts) if hosts else []
+        return sorted(filtered, key=lambda s: (
+            alive[s['url']] is None, alive[s['url']] is None and expired(s),
+            ranking.index(s['host_name'])))
+
+    def probe_sources(self, sources, backend=liveness.plowprobe):
+        """Check which sources are still alive, caching the results.
+
+        Sources are probed concurrently, with a rate limit per host, and
+        the results feed the source filtering done before every download.
+
+        :param sources: Iterable of dicts with 'host_name' and 'url' keys.
+        :type sources: iterable
+        :param backend: Probe function, liveness.plowprobe or liveness.head.
+        :type backend: function
+        :returns: List of (source, alive) tuples, alive being True, False,
+                  or None if it could not be told.
+        :rtype: list
+        """
+        return liveness.LivenessProber(backend, self.liveness).probe(
+            source for source in sources if 'error' not in source)
 
-    def random_hosts(self, number_of_hosts):
+    def random_hosts(self, number_of_hosts, size=None):
         """Retrieve a random subset of available hosts.
 
+        Only hosts that accept a file of the given size are considered.
+        With a coordinator, hosts whose circuit is open are skipped if
+        enough others remain, and busier hosts are less likely to be picked.
         The number of hosts provided must not be larger
         than the number of available of hosts, otherwise
         it will throw a ValueError exception.
 
         :param number_of_hosts: Number of hosts to connect to.
         :type number_of_hosts: int
+        :param size: Size in bytes of the file to upload, if known.
+        :type size: int
         :returns: Random subsample of available hosts.
         :rtype: list
         :raises: ValueError
         """
-        return random.sample(self.hosts, number_of_hosts)
+        candidates = self.registry.eligible(self.hosts, size)
+        state = self._cluster_state()
+        if not state:
+            return random.sample(candidates, number_of_hosts)
+
+        healthy = [host for host in candidates if state.get(host, {}).get(
+            'circuit') != coordination.OPEN]
+        if len(healthy) >= number_of_hosts:
+            candidates = healthy
+        if number_of_hosts > len(candidates):
+            raise ValueError('Sample larger than population')
+
+        # Weighted sampling without replacement, with weights inversely
+        # proportional to the number of transfers in flight on each host.
+        return sorted(candidates, reverse=True, key=lambda host:
+                      random.random() ** (
+                          1 + state.get(host, {}).get('in_flight', 0))
+                      )[:number_of_hosts]
+
+    def rendezvous_hosts(self, key, size=None):
+        """Rank the available hosts for a key by rendezvous hashing.
+
+        Hosts are ordered by their weighted rendezvous score for the key,
+        so every node computes the same placement, and adding or removing
+        a host only moves the keys it ranks first for. Unhealthy hosts
+        (with an open circuit, or too many errors without a coordinator)
+        are moved to the end, keeping their relative order.
+
+        :param key: The key being placed, usually a content hash.
+        :type key: str
+        :param size: Size in bytes of the file to upload, if known.
+        :type size: int
+        :returns: Hosts that accept the file, best placement first.
+        :rtype: list
+        """
+        candidates = self.registry.eligible(self.hosts, size)
+        state = self._cluster_state()
+
+        def healthy(host):
+            circuit = state.get(host, {}).get('circuit')
+            if circuit is not None:
+                return circuit != coordination.OPEN
+            return self._host_errors[host] < settings.CIRCUIT_ERROR_THRESHOLD
+
+        ranking = rendezvous.rank(
+            key, candidates, self.registry.weights(candidates))
+        return [host for host in ranking if healthy(host)] + \
+            [host for host in ranking if not healthy(host)]
+
+    def locate(self, key):
+        """Rank all hosts by how likely they are to hold a file.
+
+        This is the placement used by upload(..., rendezvous=True) without
+        health information, so the copies of a file can be looked up from
+        its content hash alone, most likely hosts first.
+
+        :param key: Content hash of the file.
+        :type key: str
+        :rtype: list
+        """
+        return rendezvous.rank(
+            key, self.hosts, self.registry.weights(self.hosts))
 
-    def upload(self, filename, number_of_hosts):
+    def upload(self, filename, number_of_hosts, compress=False,
+               rendezvous=False, deadline=None, priority=0):
         """Upload the given file to the specified number of hosts.
 
+        The hosts are picked at random, or by rendezvous hashing of the
+        file's content hash if rendezvous is set (see rendezvous_hosts), or
+        else the fastest measured hosts are picked if there is a deadline.
+        The remaining hosts are kept as spares, ranked by success or by
+        rendezvous score. Whenever an upload fails or straggles, a
+        spare is started in its place, until the requested number of copies
+        is reached, the spares run out, or the deadline passes.
+
+        If compress is set, a sample of the file is used to pick the codec
+        and level that make the upload fastest, if any. The file is then
+        compressed once, and the codec is recorded in every returned source
+        so that download can decompress it transparently.
+
         :param filename: The filename of the file to upload.
         :type filename: str
         :param number_of_hosts: The number of hosts to connect to.
         :type number_of_hosts: int
-        :returns:  A list of dicts with 'host_name' and 'url' keys for all
-                   successful uploads or an empty list if all uploads failed.
+        :param compress: Whether to compress the file before uploading it.
+        :type compress: bool
+        :param rendezvous: Whether to place the file deterministically.
+        :type rendezvous: bool
+        :param deadline: Time (as in time.time()) by which the upload must
+                         be done, or None.
+        :type deadline: float
+        :param priority: Higher priorities get host slots first, as do
+                         earlier deadlines within the same priority.
+        :type priority: int
+        :returns:  A list of dicts with 'host_name' and 'url' keys (and
+                   'codec' if compressed) for all successful uploads or an
+                   empty list if all uploads failed.
+        :rtype: list
+        """
+        with self._urgency(priority, deadline):
+            key = store.content_hash(filename) if rendezvous else None
+            codec = compression.choose_codec(filename) if compress else None
+            if codec is None:
+                return self._upload_with_spares(
+                    filename, number_of_hosts, key, deadline)
+
+            directory = tempfile.mkdtemp()
+            try:
+                compressed = os.path.join(
+                    directory, os.path.basename(filename) + '.' + codec[0])
+                compression.compress_file(filename, compressed, *codec)
+                uploads = self._upload_with_spares(
+                    compressed, number_of_hosts, key, deadline)
+            finally:
+                shutil.rmtree(directory, ignore_errors=True)
+
+            for upload in uploads:
+                upload['codec'] = codec[0]
+            return uploads
+
+    def upload_bundle(self, filenames, number_of_hosts):
+        """Upload many small files at once, packed in a single archive.
+
+        The files are packed into an uncompressed tar archive, which is
+        uploaded once per host (see upload). Every source of the archive is
+        then returned for each member, along with the 'offset' and 'length'
+        of the member's contents, so download can fetch it on its own.
+
+        :param filenames: Filenames of the files to upload.
+        :type filenames: list
+        :param number_of_hosts: The number of hosts to connect to.
+        :type number_of_hosts: int
+        :returns: A dict of filename to a list of dicts with 'host_name',
+                  'url', 'offset' and 'length' keys, with empty lists if
+                  all uploads failed.
+        :rtype: dict
+        """
+        directory = tempfile.mkdtemp()
+        try:
+            archive = os.path.join(directory, 'bundle.tar')
+            members = bundle.pack(filenames, archive)
+            uploads = self._upload_with_spares(archive, number_of_hosts)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+        return dict((member['filename'], [
+            dict(upload, offset=member['offset'], length=member['length'])
+            for upload in uploads]) for member in members)
+
+    def _upload_with_spares(self, filename, number_of_hosts, key=None,
+                            deadline=None):
+        """Pick hosts and spares for a file and replicate it to them.
+
+        :param filename: The filename of the file to upload.
+        :type filename: str
+        :param number_of_hosts: The number of copies to make.
+        :type number_of_hosts: int
+        :param key: Content hash to place the file by, or None to pick the
+                    hosts at random.
+        :type key: str
+        :param deadline: Time by which the upload must be done, or None.
+        :type deadline: float
+        :returns: A list of dicts with 'host_name' and 'url' keys.
         :rtype: list
+        :raises: ValueError
         """
-        return self.multiupload(filename, self.random_hosts(number_of_hosts))
+        size = self._file_size(filename)
+        eligible = self.registry.eligible(self.hosts, size)
+        if key is not None or deadline is not None:
+            ranking = self.rendezvous_hosts(key, size) if key is not None \
+                else self._hosts_by_speed(eligible)
+            if number_of_hosts > len(ranking):
+                raise ValueError('Sample larger than population')
+            return self.replicate(
+                filename, ranking[:number_of_hosts],
+                ranking[number_of_hosts:], number_of_hosts, deadline)
 
-    def download(self, sources, output_directory, filename):
+        hosts = self.random_hosts(number_of_hosts, size)
+        spares = [host for host in self._hosts_by_success(eligible)
+                  if host not in hosts] if eligible else []
+        return self.replicate(filename, hosts, spares, number_of_hosts)
+
+    def replicate(self, filename, hosts, spares, copies, deadline=None):
+        """Upload a file until the given number of copies is reached.
+
+        The upload starts on the given hosts. Each time one fails or raises,
+        the next spare is started in its place. Uploads that run much longer
+        than expected (judged by the host's measured rate, or else by how
+        long the successful uploads took) get a speculative spare started
+        next to them, up to settings.MAX_SPECULATIVE_UPLOADS at a time. The
+        call returns as soon as enough copies exist, once nothing is running
+        and no spares are left, or when the deadline passes. Uploads still
+        running or waiting for a slot are then cancelled, and their
+        outcomes are ignored, as the file may be gone by the time they end.
+
+        :param filename: The filename of the file to upload.
+        :type filename: str
+        :param hosts: Hosts to start uploading to.
+        :type hosts: list
+        :param spares: Hosts to fall back on, best first.
+        :type spares: list
+        :param copies: Number of successful uploads wanted.
+        :type copies: int
+        :param deadline: Time (as in time.time()) after which to stop
+                         waiting for uploads, or None.
+        :type deadline: float
+        :returns:  A list of at most copies dicts with 'host_name' and 'url'
+                   keys, or an empty list if all uploads failed.
+        :rtype: list
+        """
+        size = self._file_size(filename)
+        spares = list(spares)
+        condition = threading.Condition()
+        successful_uploads, durations = [], []
+        running, speculated = {}, set()
+        stopped = threading.Event()
+
+        def f(host):
+            self._local.cancelled = stopped
+            start = time.time()
+            result = {'error': 'upload did not complete'}
+            try:
+                if not stopped.is_set():
+                    result = self.upload_to_host(filename, host)
+            except Exception as e:
+                result = {'error': str(e)}
+            finally:
+                with condition:
+                    finish(host, start, result)
+
+        def finish(host, start, result):
+            running.pop(host)
+            if stopped.is_set():
+                return
+            if 'error' in result:
+                self._host_errors[host] += 1
+            elif len(successful_uploads) < copies:
+                successful_uploads.append(result)
+                durations.append(time.time() - start)
+            condition.notify_all()
+
+        carried = self._carry_urgency(f)
+
+        def start(host):
+            running[host] = time.time()
+            thread = threading.Thread(target=carried, args=(host,))
+            thread.daemon = True
+            thread.start()
+
+        def expected_duration(host):
+            rate = self.concurrency.rate(host)
+            if size and rate:
+                return size / rate
+            if durations:
+                return sorted(durations)[len(durations) // 2]
+
+        with condition:
+            for host in hosts:
+                start(host)
+
+            while len(successful_uploads) < copies:
+                missing = copies - len(successful_uploads) - \
+                    len(set(running) - speculated)
+                while missing > 0 and spares:
+                    start(spares.pop(0))
+                    missing -= 1
+                now = time.time()
+                if not running or deadline is not None and now >= deadline:
+                    break
+
+                for host, started in list(running.items()):
+                    if not spares or len(speculated.intersection(running)) \
+                            >= settings.MAX_SPECULATIVE_UPLOADS:
+                        break
+                    expected = expected_duration(host)
+                    if host in speculated or expected is None:
+                        continue
+                    if now - started > expected * settings.STRAGGLER_FACTOR:
+                        speculated.add(host)
+                        start(spares.pop(0))
+
+                timeout = settings.STRAGGLER_CHECK_INTERVAL
+                if deadline is not None:
+                    timeout = min(timeout, deadline - now)
+                condition.wait(timeout)
+
+            stopped.set()
+            uploads = list(successful_uploads)
+        self.concurrency.interrupt()
+        return uploads
+
+    def download(self, sources, output_directory, filename, swarm=False,
+                 deadline=None, priority=0):
         """Download a file from one of the provided sources
 
         The sources will be ordered by least amount of errors, so most
@@ -132,40 +618,351 @@ class Plowshare(object):
         source will be attempted, until the first successful download is
         completed or all sources have been depleted.
 
+        With a deadline, the sources are ordered by measured throughput
+        instead, and the ones that could not finish in time are dropped.
+
+        If swarm is set, the file is fetched in byte ranges from several
+        sources at once instead (see swarm_download).
+
         :param sources: A list of dicts with 'host_name' and 'url' keys.
         :type sources: list
         :param output_directory: Directory to save the downloaded file in.
         :type output_directory: str
         :param filename: Filename assigned to the downloaded file.
         :type filename: str
+        :param swarm: Whether to download byte ranges from several sources.
+        :type swarm: bool
+        :param deadline: Time (as in time.time()) by which the download must
+                         be done, or None.
+        :type deadline: float
+        :param priority: Higher priorities get host slots first, as do
+                         earlier deadlines within the same priority.
+        :type priority: int
         :returns: A dict with 'host_name' and 'filename' keys if the download
                   is successful, or an empty dict otherwise.
         :rtype: dict
         """
+        with self._urgency(priority, deadline):
+            if swarm:
+                return self.swarm_download(
+                    sources, output_directory, filename, deadline=deadline,
+                    priority=priority)
+
+            valid_sources = self._filter_sources(sources)
+            if not valid_sources:
+                return {'error': 'no valid sources'}
+
+            if deadline is not None:
+                valid_sources = self._in_time(valid_sources, deadline)
+                if not valid_sources:
+                    return {'error': 'deadline exceeded'}
+
+            manager = Manager()
+            successful_downloads = manager.list([])
+
+            def f(source):
+                if not successful_downloads:
+                    result = self.download_from_host(
+                        source, output_directory, filename)
+                    if 'error' in result:
+                        self._host_errors[source['host_name']] += 1
+                    else:
+                        successful_downloads.append(result)
+
+            multiprocessing.dummy.Pool(len(valid_sources)).map(
+                self._carry_urgency(f), valid_sources)
+
+            return successful_downloads[0] if successful_downloads else {}
+
+    def _in_time(self, sources, deadline):
+        """Order sources by measured throughput, and drop the ones that
+        could not finish downloading before the deadline.
+
+        :param sources: A list of dicts with 'host_name' and 'url' keys, and
+                        optionally the file 'size'.
+        :type sources: list
+        :param deadline: Time (as in time.time()) by which the download must
+                         be done.
+        :type deadline: float
+        :rtype: list
+        """
+        ranking = self._hosts_by_speed(
+            [source['host_name'] for source in sources])
+        return [source for source in sorted(
+                sources, key=lambda s: ranking.index(s['host_name']))
+                if (self._estimate([source['host_name']], source.get('size'))
+                    or 0) <= deadline - time.time()]
+
+    def schedule_download(self, sources, output_directory, filename,
+                          deadline=None, priority=0):
+        """Queue a download on the scheduler (see download).
+
+        The download fails early with a 'deadline exceeded' error if, by
+        the time it would start, even the fastest source could not finish
+        before the deadline. This needs the file 'size' in the sources.
+
+        :param sources: A list of dicts with 'host_name' and 'url' keys.
+        :type sources: list
+        :param output_directory: Directory to save the downloaded file in.
+        :type output_directory: str
+        :param filename: Filename assigned to the downloaded file.
+        :type filename: str
+        :param deadline: Time (as in time.time()) by which the download must
+                         be done, or None.
+        :type deadline: float
+        :param priority: Higher priorities run first, and get host slots
+                         first.
+        :type priority: int
+        :returns: A ticket whose wait() returns the result of download.
+        :rtype: scheduler.Ticket
+        """
+        size = next((s['size'] for s in sources if 'size' in s), None)
+        return self.scheduler.submit(
+            self.download, (sources, output_directory, filename),
+            {'deadline': deadline, 'priority': priority}, deadline, priority,
+            lambda: self._estimate(
+                [s['host_name'] for s in sources if 'error' not in s], size))
+
+    def schedule_upload(self, filename, number_of_hosts, deadline=None,
+                        priority=0, **kwargs):
+        """Queue an upload on the scheduler (see upload).
+
+        The upload fails early, returning an empty list like any failed
+        upload, if by the time it would start, the fastest hosts could not
+        all finish before the deadline.
+
+        :param filename: The filename of the file to upload.
+        :type filename: str
+        :param number_of_hosts: The number of hosts to connect to.
+        :type number_of_hosts: int
+        :param deadline: Time (as in time.time()) by which the upload must
+                         be done, or None.
+        :type deadline: float
+        :param priority: Higher priorities run first, and get host slots
+                         first.
+        :type priority: int
+        :param **kwargs: Additional keywords passed to upload.
+        :type **kwargs: dict
+        :returns: A ticket whose wait() returns the result of upload.
+        :rtype: scheduler.Ticket
+        """
+        kwargs.update(deadline=deadline, priority=priority)
+        return self.scheduler.submit(
+            self.upload, (filename, number_of_hosts), kwargs, deadline,
+            priority, lambda: self._estimate(
+                self.hosts, self._file_size(filename), number_of_hosts),
+            lambda error: [])
+
+    def swarm_download(self, sources, output_directory, filename,
+                       chunk_size=settings.SWARM_CHUNK_SIZE, deadline=None,
+                       priority=0):
+        """Download a file in byte ranges from several sources at once.
+
+        The direct link of every valid source is resolved, and each source
+        then fetches ranges from a shared queue, writing them straight into
+        a preallocated temporary file that is only moved into place once
+        complete. Faster sources end up fetching more ranges, and steal the
+        ranges still in flight on slower ones once the queue runs dry.
+
+        Only uncompressed, unbundled sources on hosts not known to lack
+        range support take part. If fewer than two of them can be resolved,
+        or the file size cannot be determined, this falls back to a regular
+        download, as does a swarm that could not fetch every range, since
+        direct links may only work with plowdown's cookies. Failed range
+        fetches only count against a host if the regular download fails
+        too. Sources that could not finish before the deadline are left
+        out, as in download.
+
+        :param sources: A list of dicts with 'host_name' and 'url' keys, and
+                        optionally the file 'size'.
+        :type sources: list
+        :param output_directory: Directory to save the downloaded file in.
+        :type output_directory: str
+        :param filename: Filename assigned to the downloaded file.
+        :type filename: str
+        :param chunk_size: Size in bytes of each fetched range.
+        :type chunk_size: int
+        :param deadline: Time (as in time.time()) by which the download must
+                         be done, or None.
+        :type deadline: float
+        :param priority: Higher priorities get host slots first, as do
+                         earlier deadlines within the same priority.
+        :type priority: int
+        :returns: A dict with 'host_name' (the source that contributed the
+                  most bytes), 'host_names' (every contributing source) and
+                  'filename' keys if the download is successful, or an
+                  empty dict otherwise.
+        :rtype: dict
+        """
         valid_sources = self._filter_sources(sources)
         if not valid_sources:
             return {'error': 'no valid sources'}
+        if deadline is not None:
+            valid_sources = self._in_time(valid_sources, deadline)
+            if not valid_sources:
+                return {'error': 'deadline exceeded'}
+        ranged_sources = [
+            source for source in valid_sources
+            if 'codec' not in source and 'offset' not in source and
+            self.registry[source['host_name']].supports_range is not False]
+        if len(ranged_sources) < 2:
+            return self.download(valid_sources, output_directory, filename,
+                                 deadline=deadline, priority=priority)
 
-        manager = Manager()
-        successful_downloads = manager.list([])
+        links = [link for link in multiprocessing.dummy.Pool(
+            len(ranged_sources)).map(self.resolve_direct_link, ranged_sources)
+            if 'error' not in link]
 
-        def f(source):
-            if not successful_downloads:
-                result = self.download_from_host(
-                    source, output_directory, filename)
-                if 'error' in result:
-                    self._host_errors[source['host_name']] += 1
-                else:
-                    successful_downloads.append(result)
+        size = next((s['size'] for s in valid_sources if 'size' in s), None)
+        if size is None and links:
+            size = self.remote_size(links[0]['link'])
+
+        if len(links) < 2 or not size:
+            return self.download(valid_sources, output_directory, filename,
+                                 deadline=deadline, priority=priority)
+
+        scheduler = swarm.RangeScheduler(size, chunk_size)
+        contributors = defaultdict(int)
+        path = os.path.join(output_directory, filename)
+
+        with placement.Placement(path, size) as output:
+            def f(link):
+                chunk = scheduler.next()
+                while chunk is not None:
+                    with self._slot(link['host_name']) as slot:
+                        data = self.fetch_range(link['link'], *chunk)
+                        if data is not None:
+                            slot.succeed(len(data))
+                        else:
+                            slot.discard()
+                    if data is None:
+                        scheduler.fail(chunk)
+                        return
+                    swarm.write_at(output.fd, chunk[0], data)
+                    if scheduler.complete(chunk):
+                        contributors[link['host_name']] += len(data)
+                    chunk = scheduler.next()
+
+            with self._urgency(priority, deadline):
+                multiprocessing.dummy.Pool(len(links)).map(
+                    self._carry_urgency(f), links)
+
+            finished = scheduler.finished
+            if finished:
+                output.commit()
+
+        if not finished:
+            return self.download(valid_sources, output_directory, filename,
+                                 deadline=deadline, priority=priority)
+        return {'host_name': max(sorted(contributors),
+                                 key=contributors.get),
+                'host_names': sorted(contributors), 'filename': path}
+
+    def resolve_direct_link(self, source):
+        """Resolve the final download link of a source without fetching it.
+
+        :param source: Dictionary containing information about host.
+        :type source: dict
+        :returns: Dictionary with the 'host_name' and the direct 'link', or
+                  an 'error'.
+        :rtype: dict
+        """
+        result = self._run_command(
+            ["plowdown", "--skip-final", "--printf", "%d%n", source["url"]],
+            stderr=open("/dev/null", "w")
+        )
+
+        result['host_name'] = source['host_name']
+        if 'error' not in result:
+            result['link'] = self.parse_output(
+                result['host_name'], result.pop('output'))
+
+        return result
+
+    def remote_size(self, link):
+        """Retrieve the size of the file behind a direct link.
+
+        :param link: Direct download link.
+        :type link: str
+        :returns: Size in bytes, or None if the server does not report it
+                  properly.
+        :rtype: int
+        """
+        result = self._run_command(
+            ["curl", "-sIL", link], stderr=open("/dev/null", "w"))
+        if 'error' in result:
+            return None
+
+        output = result['output']
+        if isinstance(output, bytes):
+            output = output.decode('utf-8', 'replace')
+
+        size = None
+        for line in output.splitlines():
+            name, _, value = line.partition(':')
+            if name.strip().lower() == 'content-length':
+                try:
+                    size = int(value.strip())
+                except ValueError:
+                    size = None
+        return size
 
-        multiprocessing.dummy.Pool(len(valid_sources)).map(f, valid_sources)
+    def fetch_range(self, link, offset, length):
+        """Fetch a byte range of the file behind a direct link.
 
-        return successful_downloads[0] if successful_downloads else {}
+        :param link: Direct download link.
+        :type link: str
+        :param offset: Position of the first byte to fetch.
+        :type offset: int
+        :param length: Number of bytes to fetch.
+        :type length: int
+        :returns: The fetched bytes, or None if the fetch failed or the
+                  server ignored the range.
+        :rtype: bytes
+        """
+        result = self._run_command(
+            ["curl", "-sfL", "-r",
+                "%d-%d" % (offset, offset + length - 1), link],
+            stderr=open("/dev/null", "w")
+        )
+        if 'error' in result or len(result['output']) != length:
+            return None
+        return result['output']
 
     def download_from_host(self, source, output_directory, filename):
         """Download a file from a given host.
 
-        This method renames the file to the given string.
+        This method moves the file into place under the given filename,
+        copying it if the temporary file ended up on another filesystem.
+        Compressed sources are decompressed while streaming instead, and
+        only the member is fetched from bundled sources. The download waits
+        for a free slot within the host's concurrency limit.
+
+        :param source: Dictionary containing information about host.
+        :type source: dict
+        :param output_directory: Directory to place output in.
+        :type output_directory: str
+        :param filename: The filename to rename to.
+        :type filename: str
+        :returns: Dictionary with information about downloaded file.
+        :rtype: dict
+        """
+        with self._slot(source['host_name']) as slot:
+            if 'codec' in source:
+                result = self.download_decompressed_from_host(
+                    source, output_directory, filename)
+            elif 'offset' in source:
+                result = self.download_member_from_host(
+                    source, output_directory, filename)
+            else:
+                result = self._plowdown(source, output_directory, filename)
+            if 'error' not in result:
+                slot.succeed(self._file_size(result['filename']))
+
+        return result
+
+    def _plowdown(self, source, output_directory, filename):
+        """Download a file from a given host with plowdown.
 
         :param source: Dictionary containing information about host.
         :type source: dict
@@ -192,7 +989,106 @@ class Plowshare(object):
         result['filename'] = os.path.join(output_directory, filename)
         result.pop('output')
 
-        os.rename(temporary_filename, result['filename'])
+        placement.move(temporary_filename, result['filename'])
+
+        return result
+
+    def download_member_from_host(self, source, output_directory, filename):
+        """Download a single member of a bundle from a given host.
+
+        Only the member's byte range is fetched if the host serves ranges.
+        Otherwise, or if the range fetch fails, the whole bundle is
+        downloaded to a temporary directory and the member copied out.
+
+        :param source: Dictionary containing information about host, with
+                       the 'offset' and 'length' of the member.
+        :type source: dict
+        :param output_directory: Directory to place output in.
+        :type output_directory: str
+        :param filename: The filename of the member.
+        :type filename: str
+        :returns: Dictionary with information about downloaded file.
+        :rtype: dict
+        """
+        result = {'host_name': source['host_name'],
+                  'filename': os.path.join(output_directory, filename)}
+
+        data = b'' if not source['length'] else None
+        if data is None and \
+                self.registry[source['host_name']].supports_range is not False:
+            link = self.resolve_direct_link(source)
+            if 'error' not in link:
+                data = self.fetch_range(
+                    link['link'], source['offset'], source['length'])
+
+        if data is not None:
+            with placement.Placement(result['filename']) as output:
+                swarm.write_at(output.fd, 0, data)
+                output.commit()
+            return result
+
+        directory = tempfile.mkdtemp(dir=output_directory)
+        try:
+            archive = self._plowdown(source, directory, 'bundle.tar')
+            if 'error' in archive:
+                return archive
+            with placement.Placement(result['filename']) as output:
+                with os.fdopen(os.dup(output.fd), 'wb') as f:
+                    bundle.extract(archive['filename'], source['offset'],
+                                   source['length'], f)
+                output.commit()
+        except Exception as e:
+            return {'host_name': source['host_name'], 'error': str(e)}
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+        return result
+
+    def download_decompressed_from_host(self, source, output_directory,
+                                        filename):
+        """Download a compressed file from a given host, decompressing it.
+
+        The direct link of the source is streamed through the decompressor
+        straight into a temporary file next to the destination, so the
+        compressed file is never stored.
+
+        :param source: Dictionary containing information about host, with
+                       the 'codec' the file was compressed with.
+        :type source: dict
+        :param output_directory: Directory to place output in.
+        :type output_directory: str
+        :param filename: The filename of the decompressed file.
+        :type filename: str
+        :returns: Dictionary with information about downloaded file.
+        :rtype: dict
+        """
+        result = self.resolve_direct_link(source)
+        if 'error' in result:
+            return result
+
+        link = result.pop('link')
+        result['filename'] = os.path.join(output_directory, filename)
+        process = None
+        try:
+            process = subprocess.Popen(
+                ["curl", "-sfL", link],
+                stdout=subprocess.PIPE, stderr=open("/dev/null", "w"))
+            with placement.Placement(result['filename']) as output:
+                with os.fdopen(os.dup(output.fd), 'wb') as f:
+                    compression.decompress_stream(
+                        process.stdout, f, source['codec'])
+                if process.wait() != 0:
+                    raise subprocess.CalledProcessError(
+                        process.returncode, 'curl')
+                output.commit()
+        except Exception as e:
+            return {'host_name': source['host_name'], 'error': str(e)}
+        finally:
+            if process is not None:
+                if process.poll() is None:
+                    process.kill()
+                    process.wait()
+                process.stdout.close()
 
         return result
 
@@ -201,7 +1097,8 @@ class Plowshare(object):
 
         The upload will be attempted for each host until the optimal file
         redundancy is achieved (a percentage of successful uploads) or the host
-        list is depleted.
+        list is depleted. Hosts that do not accept a file of this size are
+        skipped up front.
 
         :param filename: The filename of the file to upload.
         :type filename: str
@@ -211,6 +1108,10 @@ class Plowshare(object):
                    successful uploads or an empty list if all uploads failed.
         :rtype: list
         """
+        hosts = self.registry.eligible(hosts, self._file_size(filename))
+        if not hosts:
+            return []
+
         manager = Manager()
         successful_uploads = manager.list([])
 
@@ -225,14 +1126,15 @@ class Plowshare(object):
                     successful_uploads.append(result)
 
         multiprocessing.dummy.Pool(len(hosts)).map(
-            f, self._hosts_by_success(hosts))
+            self._carry_urgency(f), self._hosts_by_success(hosts))
 
         return list(successful_uploads)
 
     def upload_to_host(self, filename, hostname):
         """Upload a file to the given host.
 
-        This method relies on 'plowup' being installed on the system.
+        This method relies on 'plowup' being installed on the system, and
+        waits for a free slot within the host's concurrency limit.
         If it succeeds, this method returns a dictionary with the host name,
         and the final URL. Otherwise, it returns a dictionary with the
         host name and an error flag.
@@ -244,10 +1146,14 @@ class Plowshare(object):
         :returns: Dictionary containing information about upload to host.
         :rtype: dict
         """
-        result = self._run_command(
-            ["plowup", hostname, filename],
-            stderr=open("/dev/null", "w")
-        )
+        with self._slot(
+                hostname, self._file_size(filename)) as slot:
+            result = self._run_command(
+                ["plowup", hostname, filename],
+                stderr=open("/dev/null", "w")
+            )
+            if 'error' not in result:
+                slot.succeed()
 
         result['host_name'] = hostname
         if 'error' not in result:
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Storj Labs
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import hashlib
+import math
+import struct
+
+
+def score(key, host, weight=1.0):
+    """Compute the weighted rendezvous score of a host for a key.
+
+    The score is derived from a hash of both, so any node computes the
+    same value. Scores of a host with twice the weight are twice as likely
+    to come out on top.
+
+    :param key: The key being placed, such as a content hash.
+    :type key: str
+    :param host: Name of the host.
+    :type host: str
+    :param weight: Relative capacity of the host.
+    :type weight: float
+    :rtype: float
+    """
+    digest = hashlib.sha256((key + '\0' + host).encode('utf-8')).digest()
+    # Map the hash to a uniform value strictly between 0 and 1.
+    uniform = (struct.unpack('>Q', digest[:8])[0] + 0.5) / 2.0 ** 64
+    return -weight / math.log(uniform)
+
+
+def rank(key, hosts, weights=None):
+    """Order hosts by their rendezvous score for a key, highest first.
+
+    Adding or removing a host only changes the placement of the keys for
+    which that host ranks first.
+
+    :param key: The key being placed, such as a content hash.
+    :type key: str
+    :param hosts: List of host names.
+    :type hosts: list
+    :param weights: Dict of host name to relative capacity, defaulting to 1.
+    :type weights: dict
+    :rtype: list
+    """
+    weights = weights or {}
+    return sorted(hosts, reverse=True, key=lambda host:
+                  score(key, host, weights.get(host, 1.0)))
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Storj Labs
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import heapq
+import shutil
+import tempfile
+import time
+from itertools import islice
+
+from . import liveness
+from . import settings
+
+
+class Repairer(object):
+
+    """Restore the redundancy of files whose copies have expired.
+
+    Manifests are dicts with the content 'hash' of a file and the list of
+    its 'sources', as returned by Plowshare.upload. Their sources are
+    probed, and every file with fewer live copies than the target is
+    downloaded once from a surviving source and uploaded again to fresh
+    hosts, the files closest to being lost first.
+    """
+
+    def __init__(self, plowshare, copies=settings.REPAIR_COPIES,
+                 backend=liveness.plowprobe,
+                 interval=settings.REPAIR_INTERVAL):
+        """Initialize the repairer.
+
+        :param plowshare: Instance used to probe, download and upload.
+        :type plowshare: Plowshare
+        :param copies: Number of live copies every file should have.
+        :type copies: int
+        :param backend: Probe function, liveness.plowprobe or liveness.head.
+        :type backend: function
+        :param interval: Minimum number of seconds between two repairs.
+        :type interval: float
+        """
+        self.plowshare = plowshare
+        self.copies = copies
+        self.interval = interval
+        self.prober = liveness.LivenessProber(backend, plowshare.liveness)
+
+    def assess(self, manifests):
+        """Count the live copies of every file.
+
+        :param manifests: Iterable of dicts with 'hash' and 'sources' keys.
+        :type manifests: iterable
+        :returns: Iterator of (manifest, live sources) tuples. Sources that
+                  could not be probed are counted as live.
+        :rtype: iterator
+        """
+        manifests = iter(manifests)
+        while True:
+            batch = list(islice(manifests, settings.PROBE_BATCH_SIZE))
+            if not batch:
+                break
+            sources = [source for manifest in batch
+                       for source in manifest['sources']
+                       if 'error' not in source]
+            dead = set(source['url'] for source, alive
+                       in self.prober.iprobe(sources) if alive is False)
+            for manifest in batch:
+                yield manifest, [
+                    source for source in manifest['sources']
+                    if 'error' not in source and source['url'] not in dead]
+
+    def plan(self, manifests):
+        """Find the files below the target number of copies.
+
+        :param manifests: Iterable of dicts with 'hash' and 'sources' keys.
+        :type manifests: iterable
+        :returns: List of (manifest, live sources) tuples, the files with
+                  the fewest live copies first. Files with no live copy
+                  left are included, as they can only be reported lost.
+        :rtype: list
+        """
+        queue = []
+        for index, (manifest, live) in enumerate(self.assess(manifests)):
+            if len(live) < self.copies:
+                heapq.heappush(queue, (len(live), index, manifest, live))
+        return [heapq.heappop(queue)[2:] for _ in range(len(queue))]
+
+    def repair(self, manifests):
+        """Re-replicate every file below the target number of copies.
+
+        Repairs are spaced out by the configured interval, and each file is
+        fetched once and uploaded to hosts that do not hold it yet.
+
+        :param manifests: Iterable of dicts with 'hash' and 'sources' keys.
+        :type manifests: iterable
+        :returns: Iterator of updated manifests, with the live sources and
+                  the new ones. Files with no live copy left get an 'error'
+                  key instead, and keep their sources.
+        :rtype: iterator
+        """
+        last = None
+        for manifest, live in self.plan(manifests):
+            if not live:
+                yield dict(manifest, error='no live sources')
+                continue
+
+            if last is not None:
+                time.sleep(max(0, last + self.interval - time.time()))
+            last = time.time()
+
+            yield dict(manifest, sources=live + self.replicate(
+                manifest['hash'], live, self.copies - len(live)))
+
+    def replicate(self, key, live, copies):
+        """Fetch a file from its live sources and upload new copies.
+
+        :param key: Content hash of the file, used as its filename.
+        :type key: str
+        :param live: Live sources of the file.
+        :type live: list
+        :param copies: Number of new copies to make.
+        :type copies: int
+        :returns: List of new sources, possibly fewer than asked for.
+        :rtype: list
+        """
+        held = set(source['host_name'] for source in live)
+        fresh = [host for host in self.plowshare._hosts_by_success()
+                 if host not in held]
+        if not fresh:
+            return []
+
+        directory = tempfile.mkdtemp()
+        try:
+            result = self.plowshare.download(live, directory, key)
+            if 'filename' not in result:
+                return []
+            fresh = self.plowshare.registry.eligible(
+                fresh, self.plowshare._file_size(result['filename']))
+            return self.plowshare.replicate(
+                result['filename'], fresh[:copies], fresh[copies:], copies)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
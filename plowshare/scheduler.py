@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Storj Labs
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import heapq
+import itertools
+import threading
+import time
+
+from . import settings
+
+
+class Ticket(object):
+
+    """Handle on a transfer submitted to a Scheduler."""
+
+    def __init__(self, deadline=None, priority=0):
+        self.deadline = deadline
+        self.priority = priority
+        self.result = None
+        self._done = threading.Event()
+
+    def done(self):
+        """Whether the transfer has finished, or failed early."""
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """Wait for the transfer to finish and return its result.
+
+        :param timeout: Most seconds to wait, or None to wait forever.
+        :type timeout: float
+        :returns: The result of the transfer, or None on timeout.
+        """
+        self._done.wait(timeout)
+        return self.result
+
+    def _resolve(self, result):
+        self.result = result
+        self._done.set()
+
+
+class Scheduler(object):
+
+    """Run transfers on a fixed set of workers, most urgent first.
+
+    Queued transfers run by priority, and by earliest deadline within the
+    same priority. A transfer whose deadline can no longer be met, given
+    its estimated duration, fails early with a 'deadline exceeded' error
+    instead of running.
+    """
+
+    def __init__(self, workers=settings.SCHEDULER_WORKERS):
+        """Initialize the scheduler. Workers are started on first use.
+
+        :param workers: Number of transfers running at once.
+        :type workers: int
+        """
+        self.workers = workers
+        self._queue = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._threads = []
+        self._closed = False
+
+    def __len__(self):
+        with self._condition:
+            return len(self._queue)
+
+    def submit(self, function, args=(), kwargs=None, deadline=None,
+               priority=0, estimate=None, failure=None):
+        """Queue a transfer.
+
+        :param function: The transfer to run, such as Plowshare.download.
+        :type function: function
+        :param args: Positional arguments of the transfer.
+        :type args: tuple
+        :param kwargs: Keyword arguments of the transfer.
+        :type kwargs: dict
+        :param deadline: Time (as in time.time()) by which the transfer
+                         must be done, or None.
+        :type deadline: float
+        :param priority: Higher priorities run first.
+        :type priority: int
+        :param estimate: Function returning the expected duration of the
+                         transfer in seconds, or None if unknown. It is
+                         called again right before the transfer starts.
+        :type estimate: function
+        :param failure: Function turning an error message into the result
+                        of the transfer, for transfers that fail early or
+                        raise. By default, a dict with an 'error' key.
+        :type failure: function
+        :rtype: Ticket
+        """
+        ticket = Ticket(deadline, priority)
+        failure = failure or (lambda error: {'error': error})
+        if self._doomed(deadline, estimate):
+            ticket._resolve(failure('deadline exceeded'))
+            return ticket
+
+        with self._condition:
+            if self._closed:
+                raise RuntimeError('scheduler is closed')
+            heapq.heappush(self._queue, (
+                -priority, deadline if deadline is not None else
+                float('inf'), next(self._counter),
+                ticket, function, args, kwargs or {}, estimate, failure))
+            if len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work)
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+            self._condition.notify()
+        return ticket
+
+    def close(self):
+        """Stop the workers once the queued transfers are done."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join()
+
+    def _doomed(self, deadline, estimate):
+        if deadline is None:
+            return False
+        duration = estimate() if estimate is not None else None
+        return time.time() + (duration or 0) > deadline
+
+    def _work(self):
+        while True:
+            with self._condition:
+                while not self._queue and not self._closed:
+                    self._condition.wait()
+                if not self._queue:
+                    return
+                entry = heapq.heappop(self._queue)
+
+            ticket, function, args, kwargs, estimate, failure = entry[3:]
+            if self._doomed(ticket.deadline, estimate):
+                ticket._resolve(failure('deadline exceeded'))
+                continue
+            try:
+                ticket._resolve(function(*args, **kwargs))
+            except Exception as e:
+                ticket._resolve(failure(str(e)))
@@ -26,3 +26,88 @@
 # Minimum upload success percentage of available hosts to ensure proper
 # file redundancy
 MIN_FILE_REDUNDANCY = 0.6
+
+# Size in bytes of the byte ranges fetched from each source when swarming a
+# download across several mirrors
+SWARM_CHUNK_SIZE = 4 * 1024 * 1024
+
+# Size in bytes of the sample used to pick a compression codec before upload
+COMPRESSION_SAMPLE_SIZE = 1024 * 1024
+
+# Samples above this entropy (in bits per byte) are considered incompressible
+COMPRESSION_MAX_ENTROPY = 7.5
+
+# Expected upload bandwidth in bytes per second, used to weigh compression
+# time against transfer time
+COMPRESSION_BANDWIDTH = 1024 * 1024
+
+# Number of simultaneous transfers allowed per host before the adaptive
+# concurrency controller has measured it, and the most it may ever allow
+AIMD_INITIAL_LIMIT = 2
+AIMD_MAX_LIMIT = 16
+
+# Factor applied to a host's concurrency limit after an error or a collapse
+# in throughput
+AIMD_DECREASE_FACTOR = 0.5
+
+# Aggregate throughput below this fraction of its average is a collapse
+AIMD_COLLAPSE_RATIO = 0.5
+
+# Weight of the latest sample in the smoothed throughput averages
+AIMD_SMOOTHING = 0.3
+
+# An upload running this many times longer than expected is a straggler,
+# and gets a spare host started next to it
+STRAGGLER_FACTOR = 3.0
+
+# Most spare uploads started next to stragglers at once, for a single file
+MAX_SPECULATIVE_UPLOADS = 2
+
+# Seconds between checks for stragglers while uploading
+STRAGGLER_CHECK_INTERVAL = 1.0
+
+# Seconds a link liveness probe result is trusted for, and the most results
+# kept in memory at once
+LIVENESS_TTL = 3600
+LIVENESS_CACHE_SIZE = 100000
+
+# Number of link liveness probes running at once, the most probes per
+# second sent to a single host, and the number of sources probed per batch
+PROBE_WORKERS = 32
+PROBE_RATE = 5.0
+PROBE_BATCH_SIZE = 1000
+
+# Timeout in seconds of the HTTP HEAD liveness probe
+PROBE_TIMEOUT = 10
+
+# Number of live copies the repair engine keeps for every file, and the
+# minimum number of seconds between two repairs
+REPAIR_COPIES = 3
+REPAIR_INTERVAL = 1.0
+
+# Number of manifests read at once when iterating over a manifest store
+STORE_PAGE_SIZE = 1000
+
+# Consecutive errors that open a host's circuit, and seconds before an open
+# circuit lets a transfer through again
+CIRCUIT_ERROR_THRESHOLD = 3
+CIRCUIT_COOLDOWN = 300
+
+# Seconds to wait for the coordinator service, seconds before trying it
+# again once it was found unreachable, and seconds its host state is reused
+COORDINATOR_TIMEOUT = 2
+COORDINATOR_RETRY = 30
+COORDINATOR_CACHE_TTL = 1
+
+# Seconds a node's report of its transfers in flight holds on the
+# coordinator, and seconds between the reports a node repeats meanwhile
+COORDINATOR_LEASE = 120
+COORDINATOR_HEARTBEAT = 30
+
+# Number of transfers the central scheduler runs at once
+SCHEDULER_WORKERS = 8
+
+# Number of files uploaded at once by the preparation pipeline, and the most
+# files it holds at once, whether being prepared, waiting or uploading
+PIPELINE_TRANSFERS = 4
+PIPELINE_SIZE = 16
@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Storj Labs
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from itertools import groupby, islice
+
+from . import settings
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    hash TEXT PRIMARY KEY,
+    size INTEGER
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sources (
+    hash TEXT NOT NULL,
+    host_name TEXT NOT NULL,
+    url TEXT NOT NULL,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS sources_by_hash ON sources (hash);
+CREATE INDEX IF NOT EXISTS sources_by_host ON sources (host_name, hash);
+"""
+
+
+def content_hash(filename):
+    """Compute the SHA-256 hex digest of a file's contents.
+
+    :param filename: The filename of the file to hash.
+    :type filename: str
+    :rtype: str
+    """
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ManifestStore(object):
+
+    """Indexed on-disk store of upload manifests, backed by SQLite.
+
+    A manifest is a dict with the content 'hash' of a file, its 'size' if
+    known, and its 'sources' as returned by Plowshare.upload. Manifests are
+    keyed by hash, and sources are also indexed by host. The store can be
+    iterated over, so it plugs straight into Repairer.repair, and its
+    sources can be passed to Plowshare.download as they are.
+    """
+
+    def __init__(self, path=':memory:'):
+        """Open the store, creating it if needed.
+
+        :param path: Path of the SQLite database file.
+        :type path: str
+        """
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.executescript(SCHEMA)
+
+    def close(self):
+        """Close the underlying database."""
+        self._db.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM files').fetchone()[0]
+
+    def __contains__(self, key):
+        with self._lock:
+            return self._db.execute(
+                'SELECT 1 FROM files WHERE hash = ?', (key,)).fetchone() \
+                is not None
+
+    def __iter__(self):
+        """Iterate over every manifest, ordered by hash.
+
+        Manifests are read one page at a time, so the store can be updated
+        while iterating.
+        """
+        last = ''
+        while True:
+            with self._lock:
+                rows = self._db.execute(
+                    'SELECT hash, size FROM files WHERE hash > ? '
+                    'ORDER BY hash LIMIT ?',
+                    (last, settings.STORE_PAGE_SIZE)).fetchall()
+                if not rows:
+                    return
+                sources = self._sources(
+                    'hash >= ? AND hash <= ?', (rows[0][0], rows[-1][0]))
+            for key, size in rows:
+                yield self._manifest(key, size, sources.get(key, []))
+            last = rows[-1][0]
+
+    def _sources(self, where, parameters):
+        rows = self._db.execute(
+            'SELECT hash, host_name, url, extra FROM sources WHERE ' +
+            where + ' ORDER BY hash, rowid', parameters)
+        return dict(
+            (key, [self._source(*row[1:]) for row in group])
+            for key, group in groupby(rows, key=lambda row: row[0]))
+
+    def _source(self, host_name, url, extra):
+        source = json.loads(extra) if extra else {}
+        source.update(host_name=host_name, url=url)
+        return source
+
+    def _manifest(self, key, size, sources):
+        manifest = {'hash': key, 'sources': sources}
+        if size is not None:
+            manifest['size'] = size
+        return manifest
+
+    def get(self, key):
+        """Look up the manifest of a file.
+
+        :param key: Content hash of the file.
+        :type key: str
+        :returns: The manifest, or None if the file is unknown.
+        :rtype: dict
+        """
+        with self._lock:
+            row = self._db.execute(
+                'SELECT size FROM files WHERE hash = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            sources = self._sources('hash = ?', (key,))
+        return self._manifest(key, row[0], sources.get(key, []))
+
+    def hashes_on_host(self, host_name):
+        """List the files with a source on the given host.
+
+        :param host_name: Name of the host.
+        :type host_name: str
+        :returns: Content hashes, in order.
+        :rtype: list
+        """
+        with self._lock:
+            return [row[0] for row in self._db.execute(
+                'SELECT DISTINCT hash FROM sources WHERE host_name = ? '
+                'ORDER BY hash', (host_name,))]
+
+    def put(self, manifest):
+        """Insert or replace a manifest (see put_many).
+
+        :param manifest: Dict with 'hash', 'sources' and optionally 'size'.
+        :type manifest: dict
+        """
+        self.put_many([manifest])
+
+    def put_many(self, manifests):
+        """Insert or replace manifests in bulk, one transaction per page.
+
+        The sources of each manifest replace any stored before. Sources
+        with an 'error' key are not stored. Each page of manifests is read
+        before locking the store, so they may be produced while iterating
+        over it.
+
+        :param manifests: Iterable of dicts with 'hash', 'sources' and
+                          optionally 'size'.
+        :type manifests: iterable
+        """
+        manifests = iter(manifests)
+        while True:
+            batch = list(islice(manifests, settings.STORE_PAGE_SIZE))
+            if not batch:
+                break
+            with self._lock:
+                with self._db:
+                    self._insert(batch)
+
+    def _insert(self, manifests):
+        files, hashes, sources = [], [], []
+        for manifest in manifests:
+            files.append((manifest['hash'], manifest.get('size')))
+            hashes.append((manifest['hash'],))
+            for source in manifest['sources']:
+                if 'error' in source:
+                    continue
+                extra = dict((k, v) for k, v in source.items()
+                             if k not in ('host_name', 'url'))
+                sources.append((
+                    manifest['hash'], source['host_name'], source['url'],
+                    json.dumps(extra, sort_keys=True) if extra else None))
+
+        self._db.executemany('DELETE FROM sources WHERE hash = ?', hashes)
+        self._db.executemany(
+            'INSERT OR REPLACE INTO files (hash, size) VALUES (?, ?)', files)
+        self._db.executemany(
+            'INSERT INTO sources (hash, host_name, url, extra) '
+            'VALUES (?, ?, ?, ?)', sources)
+
+    def add_upload(self, filename, sources):
+        """Record the sources of an uploaded file under its content hash.
+
+        Each source is stamped with the current time as 'uploaded_at',
+        unless it already has one, so downloads can tell which copies have
+        probably outlived their host's retention.
+
+        :param filename: The filename of the uploaded file.
+        :type filename: str
+        :param sources: Sources returned by Plowshare.upload.
+        :type sources: list
+        :returns: The stored manifest.
+        :rtype: dict
+        """
+        now = time.time()
+        manifest = {'hash': content_hash(filename),
+                    'size': os.path.getsize(filename),
+                    'sources': [dict(source, uploaded_at=source.get(
+                        'uploaded_at', now)) for source in sources
+                        if 'error' not in source]}
+        self.put(manifest)
+        return manifest
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Storj Labs
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import os
+import threading
+from collections import deque
+
+# Serializes seek/write pairs on platforms without os.pwrite.
+_write_lock = threading.Lock()
+
+
+def split_ranges(size, chunk_size):
+    """Split a file of the given size into (offset, length) byte ranges.
+
+    >>> split_ranges(10, 4)
+    [(0, 4), (4, 4), (8, 2)]
+
+    :param size: Total size of the file in bytes.
+    :type size: int
+    :param chunk_size: Maximum length of each range.
+    :type chunk_size: int
+    :returns: List of (offset, length) tuples covering the whole file.
+    :rtype: list
+    """
+    return [(offset, min(chunk_size, size - offset))
+            for offset in range(0, size, chunk_size)]
+
+
+def write_at(fd, offset, data):
+    """Write data at the given offset of an open file descriptor.
+
+    Uses positional writes when available, so several threads can fill
+    different ranges of the same file without sharing a file position.
+
+    :param fd: File descriptor opened for writing.
+    :type fd: int
+    :param offset: Position in the file to start writing at.
+    :type offset: int
+    :param data: Bytes to write.
+    :type data: bytes
+    """
+    if hasattr(os, 'pwrite'):
+        view = memoryview(data)
+        while view:
+            written = os.pwrite(fd, view, offset)
+            view, offset = view[written:], offset + written
+    else:
+        with _write_lock:
+            os.lseek(fd, offset, os.SEEK_SET)
+            os.write(fd, data)
+
+
+class RangeScheduler(object):
+
+    """Hand out byte ranges of a file to concurrent source workers.
+
+    Workers pull ranges from a shared queue, so faster sources naturally
+    take on more of the file. Once the queue is empty, idle workers steal
+    ranges that are still in flight on slower sources; whichever copy
+    finishes first wins.
+    """
+
+    def __init__(self, size, chunk_size, max_holders=2):
+        """Initialize the scheduler for a file of the given size.
+
+        :param size: Total size of the file in bytes.
+        :type size: int
+        :param chunk_size: Maximum length of each range.
+        :type chunk_size: int
+        :param max_holders: Maximum number of workers fetching the same range.
+        :type max_holders: int
+        """
+        self._pending = deque(split_ranges(size, chunk_size))
+        self._in_flight = {}
+        self._done = set()
+        self._lock = threading.Lock()
+        self._max_holders = max_holders
+        self.total = len(self._pending)
+
+    @property
+    def finished(self):
+        """Whether every range of the file has been completed."""
+        return len(self._done) == self.total
+
+    def next(self):
+        """Return the next range to fetch, or None if there is nothing left.
+
+        :returns: An (offset, length) tuple or None.
+        :rtype: tuple
+        """
+        with self._lock:
+            if self._pending:
+                chunk = self._pending.popleft()
+            else:
+                stealable = [c for c, holders in self._in_flight.items()
+                             if holders < self._max_holders]
+                if not stealable:
+                    return None
+                chunk = min(stealable, key=lambda c: self._in_flight[c])
+            self._in_flight[chunk] = self._in_flight.get(chunk, 0) + 1
+            return chunk
+
+    def complete(self, chunk):
+        """Mark a range as completed.
+
+        :param chunk: The (offset, length) tuple that was fetched.
+        :type chunk: tuple
+        :returns: False if another worker had already completed it.
+        :rtype: bool
+        """
+        with self._lock:
+            self._in_flight.pop(chunk, None)
+            if chunk in self._done:
+                return False
+            self._done.add(chunk)
+            return True
+
+    def fail(self, chunk):
+        """Give a range back after a failed fetch.
+
+        The range is queued again unless it was completed meanwhile or is
+        still being fetched by another worker.
+
+        :param chunk: The (offset, length) tuple that failed.
+        :type chunk: tuple
+        """
+        with self._lock:
+            if chunk in self._done:
+                return
+            holders = self._in_flight.pop(chunk, 1) - 1
+            if holders > 0:
+                self._in_flight[chunk] = holders
+            else:
+                self._pending.appendleft(chunk)
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Storj Labs
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import io
+
+import pytest
+from plowshare import bundle
+
+
+@pytest.fixture
+def files(tmpdir):
+    paths = []
+    for name, content in [('a.json', b'{}'), ('b.log', b'everything'),
+                          ('empty', b'')]:
+        path = tmpdir.join(name)
+        path.write_binary(content)
+        paths.append(str(path))
+    return paths
+
+
+def test_pack(files, tmpdir):
+    archive = str(tmpdir.join('bundle.tar'))
+    members = bundle.pack(files, archive)
+    assert [(m['filename'], m['name'], m['length']) for m in members] == [
+        (files[0], 'a.json', 2), (files[1], 'b.log', 10),
+        (files[2], 'empty', 0)]
+
+    data = tmpdir.join('bundle.tar').read_binary()
+    assert [data[m['offset']:m['offset'] + m['length']]
+            for m in members] == [b'{}', b'everything', b'']
+
+
+def test_extract(files, tmpdir):
+    archive = str(tmpdir.join('bundle.tar'))
+    member = bundle.pack(files, archive)[1]
+    output = io.BytesIO()
+    bundle.extract(archive, member['offset'], member['length'], output)
+    assert output.getvalue() == b'everything'
+
+    with pytest.raises(EOFError):
+        bundle.extract(archive, member['offset'], 10 ** 6, io.BytesIO())
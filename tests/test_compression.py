@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Storj Labs
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import io
+import os
+
+import pytest
+from plowshare import compression
+
+
+@pytest.fixture
+def text_file(tmpdir):
+    path = tmpdir.join('log.txt')
+    path.write(''.join('line %d: everything is fine\n' % i
+                       for i in range(10000)))
+    return str(path)
+
+
+@pytest.fixture
+def random_file(tmpdir):
+    path = tmpdir.join('random.bin')
+    path.write_binary(os.urandom(100000))
+    return str(path)
+
+
+def test_entropy():
+    assert compression.entropy(b'') == 0.0
+    assert compression.entropy(b'aaaa') == 0.0
+    assert compression.entropy(bytearray(range(256))) == 8.0
+
+
+def test_sample(tmpdir):
+    path = tmpdir.join('file')
+    path.write_binary(b'a' * 10 + b'b' * 10 + b'c' * 10)
+    assert compression.sample(str(path), 6) == b'aabbcc'
+
+
+def test_choose_codec(text_file, random_file):
+    codec, level = compression.choose_codec(text_file)
+    assert codec in compression.codecs
+    assert level in compression.codecs[codec]['levels']
+    assert compression.choose_codec(random_file) is None
+
+
+@pytest.mark.parametrize('codec', sorted(compression.codecs))
+def test_compress_roundtrip(text_file, tmpdir, codec):
+    compressed = str(tmpdir.join('log.txt.' + codec))
+    level = compression.codecs[codec]['levels'][0]
+    compression.compress_file(text_file, compressed, codec, level)
+    assert os.path.getsize(compressed) < os.path.getsize(text_file)
+
+    output = io.BytesIO()
+    with open(compressed, 'rb') as f:
+        written = compression.decompress_stream(f, output, codec)
+    with open(text_file, 'rb') as f:
+        assert output.getvalue() == f.read()
+    assert written == len(output.getvalue())
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Storj Labs
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import threading
+import time
+
+import pytest
+from plowshare.concurrency import (AdaptiveLimit, Cancelled,
+                                   ConcurrencyController)
+from plowshare.hosts import HostRegistry
+
+
+def test_additive_increase():
+    limit = AdaptiveLimit(initial=2, ceiling=4)
+    limit.acquire()
+    limit.release(True)
+    assert limit.limit == 2.5
+    limit.acquire()
+    limit.release(True)
+    assert limit.limit == 3.0
+
+
+def test_ceiling():
+    limit = AdaptiveLimit(initial=2, ceiling=2)
+    limit.acquire()
+    limit.release(True)
+    assert limit.limit == 2.0
+
+
+def test_multiplicative_decrease():
+    limit = AdaptiveLimit(initial=8)
+    limit.acquire()
+    limit.release(False)
+    assert limit.limit == 4.0
+    for _ in range(4):
+        limit.acquire()
+        limit.release(False)
+    assert limit.limit == 1.0
+
+
+def test_throughput_collapse():
+    limit = AdaptiveLimit(initial=4)
+    limit.acquire()
+    limit.release(True, 1000, 1.0)
+    assert limit.rate == 1000
+    before = limit.limit
+    limit.acquire()
+    limit.release(True, 100, 1.0)
+    assert limit.limit == before / 2
+
+
+def test_acquire_blocks():
+    limit = AdaptiveLimit(initial=1)
+    limit.acquire()
+    acquired = threading.Event()
+
+    def acquire():
+        limit.acquire()
+        acquired.set()
+
+    thread = threading.Thread(target=acquire)
+    thread.start()
+    assert not acquired.wait(0.05)
+    limit.release(True)
+    assert acquired.wait(1)
+    thread.join()
+
+
+def test_acquire_order():
+    limit = AdaptiveLimit(initial=1, ceiling=1)
+    limit.acquire()
+    order, threads = [], []
+
+    def acquire(name, priority=0, deadline=None):
+        limit.acquire(priority, deadline)
+        order.append(name)
+        limit.release(True)
+
+    for args in [('bulk',), ('late', 0, 20), ('early', 0, 10),
+                 ('urgent', 1)]:
+        threads.append(threading.Thread(target=acquire, args=args))
+        threads[-1].start()
+        while len(limit._waiting) < len(threads):
+            time.sleep(0.01)
+    limit.release(True)
+    for thread in threads:
+        thread.join()
+    assert order == ['urgent', 'early', 'late', 'bulk']
+
+
+def test_acquire_cancelled():
+    controller = ConcurrencyController()
+    limit = controller.limit('rghost')
+    limit.limit = 1.0
+    limit.acquire()
+    cancelled, errors = threading.Event(), []
+
+    def acquire():
+        try:
+            with controller.slot('rghost', cancelled=cancelled):
+                pass
+        except Cancelled as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=acquire)
+    thread.start()
+    while not limit._waiting:
+        time.sleep(0.01)
+    cancelled.set()
+    controller.interrupt()
+    thread.join(1)
+    assert len(errors) == 1
+    assert (limit.in_flight, limit._waiting) == (1, [])
+
+
+def test_cancelled_slot_keeps_limit():
+    controller = ConcurrencyController()
+    limit = controller.limit('rghost')
+    initial = limit.limit
+    cancelled = threading.Event()
+    with controller.slot('rghost', cancelled=cancelled):
+        cancelled.set()
+    assert (limit.in_flight, limit.limit) == (0, initial)
+
+
+def test_controller_registry_ceiling():
+    controller = ConcurrencyController(
+        HostRegistry.from_dict({'rghost': {'max_concurrency': 1}}))
+    assert controller.limit('rghost').ceiling == 1
+    assert controller.limit('rghost') is controller.limit('rghost')
+    assert controller.limit('ge_tt').ceiling > 1
+
+
+def test_controller_slot():
+    controller = ConcurrencyController()
+    with controller.slot('rghost', 1000) as slot:
+        assert controller.limit('rghost').in_flight == 1
+        slot.succeed()
+    assert controller.limit('rghost').in_flight == 0
+    assert controller.rate('rghost') > 0
+
+    with pytest.raises(RuntimeError):
+        with controller.slot('rghost'):
+            raise RuntimeError()
+    assert controller.limit('rghost').in_flight == 0
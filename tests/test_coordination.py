@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Storj Labs
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import threading
+import time
+
+import pytest
+from plowshare import coordination
+from plowshare.coordination import (CoordinatorServer, LocalCoordinator,
+                                    RemoteCoordinator)
+
+
+@pytest.fixture
+def server():
+    server = CoordinatorServer(('127.0.0.1', 0))
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_circuit():
+    coordinator = LocalCoordinator(threshold=2, cooldown=60)
+    for _ in range(2):
+        coordinator.begin('rghost')
+        coordinator.end('rghost', False)
+    assert coordinator.snapshot() == {'rghost': {
+        'errors': 2, 'circuit': coordination.OPEN, 'in_flight': 0}}
+
+    coordinator.cooldown = 0
+    assert coordinator.snapshot()['rghost']['circuit'] == \
+        coordination.HALF_OPEN
+    coordinator.begin('rghost')
+    coordinator.end('rghost', True)
+    assert coordinator.snapshot()['rghost']['circuit'] == coordination.CLOSED
+
+
+def test_in_flight():
+    coordinator = LocalCoordinator()
+    coordinator.begin('rghost')
+    coordinator.begin('rghost')
+    coordinator.end('rghost', True)
+    assert coordinator.snapshot()['rghost']['in_flight'] == 1
+
+
+def test_cancelled():
+    coordinator = LocalCoordinator()
+    coordinator.begin('rghost')
+    coordinator.end('rghost', None)
+    assert coordinator.snapshot() == {'rghost': {
+        'errors': 0, 'circuit': coordination.CLOSED, 'in_flight': 0}}
+
+
+def test_remote(server):
+    url = 'http://127.0.0.1:%d' % server.server_address[1]
+    first, second = RemoteCoordinator(url), RemoteCoordinator(url)
+    first.begin('rghost')
+    second.begin('rghost')
+    second.end('rghost', False)
+    assert first.snapshot() == {'rghost': {
+        'errors': 1, 'circuit': coordination.CLOSED, 'in_flight': 1}}
+
+
+def test_remote_unreachable(server):
+    url = 'http://127.0.0.1:%d' % server.server_address[1]
+    server.shutdown()
+    server.server_close()
+    coordinator = RemoteCoordinator(url, timeout=0.5)
+    coordinator.begin('rghost')
+    coordinator.end('rghost', False)
+    assert coordinator.snapshot() == {'rghost': {
+        'errors': 1, 'circuit': coordination.CLOSED, 'in_flight': 0}}
+
+
+def test_report_lease():
+    coordinator = LocalCoordinator(lease=60)
+    coordinator.report('node', {'rghost': 2})
+    coordinator.report('node', {'rghost': 1})
+    coordinator.begin('rghost')
+    assert coordinator.snapshot()['rghost']['in_flight'] == 2
+
+    coordinator.lease = 0
+    coordinator.report('node', {'rghost': 1})
+    assert coordinator.snapshot()['rghost']['in_flight'] == 1
+
+
+def test_remote_crashed_node(server):
+    url = 'http://127.0.0.1:%d' % server.server_address[1]
+    server.coordinator.lease = 0.2
+    crashed = RemoteCoordinator(url)
+    crashed.begin('rghost')
+    crashed.close()
+    assert server.coordinator.snapshot()['rghost']['in_flight'] == 1
+    time.sleep(0.3)
+    assert server.coordinator.snapshot()['rghost']['in_flight'] == 0
+
+
+def test_remote_heartbeat(server):
+    url = 'http://127.0.0.1:%d' % server.server_address[1]
+    server.coordinator.lease = 0.3
+    coordinator = RemoteCoordinator(url, retry=0.2, heartbeat=0.05)
+    try:
+        coordinator.begin('rghost')
+        coordinator.begin('ge_tt')
+        time.sleep(0.5)
+        assert server.coordinator.snapshot()['rghost']['in_flight'] == 1
+
+        # The end falls in the window where the server is left alone
+        coordinator._unreachable_until = time.time() + 0.2
+        coordinator.end('rghost', True)
+        assert server.coordinator.snapshot()['rghost']['in_flight'] == 1
+        time.sleep(0.4)
+        snapshot = server.coordinator.snapshot()
+        assert snapshot['rghost']['in_flight'] == 0
+        assert snapshot['ge_tt']['in_flight'] == 1
+    finally:
+        coordinator.close()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Storj Labs
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import json
+
+from plowshare.hosts import Host, HostRegistry, anonymous, registry
+
+
+def test_host_accepts():
+    host = Host('rghost', max_file_size=100)
+    assert host.accepts(100)
+    assert not host.accepts(101)
+    assert host.accepts(None)
+    assert Host('ge_tt').accepts(10 ** 12)
+
+
+def test_registry_unknown_host():
+    host = HostRegistry()['rghost']
+    assert host.name == 'rghost'
+    assert host.max_file_size is None
+    assert 'rghost' not in HostRegistry()
+
+
+def test_registry_from_file(tmpdir):
+    config = tmpdir.join('hosts.json')
+    config.write(json.dumps({
+        'rghost': {'max_file_size': 100, 'supports_range': True},
+        'ge_tt': {'max_concurrency': 2, 'retention': 86400},
+    }))
+    hosts = HostRegistry.from_file(str(config))
+    assert hosts['rghost'].supports_range
+    assert hosts['ge_tt'].max_concurrency == 2
+    assert hosts.eligible(['rghost', 'ge_tt', 'zalil_ru'], 1000) == \
+        ['ge_tt', 'zalil_ru']
+
+
+def test_default_registry():
+    assert all(name in registry for name in anonymous)
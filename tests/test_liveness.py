@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Storj Labs
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import subprocess
+import time
+
+from plowshare import liveness
+from plowshare.liveness import HostRateLimiter, LivenessCache, LivenessProber
+
+SOURCE = {'host_name': 'rghost', 'url': 'http://rghost.net/57830097'}
+
+
+def test_cache():
+    cache = LivenessCache()
+    assert cache.get('testurl') is None
+    cache.set('testurl', False)
+    assert cache.get('testurl') is False
+    cache.set('otherurl', None)
+    assert len(cache) == 1
+
+
+def test_cache_expiry():
+    cache = LivenessCache(ttl=-1)
+    cache.set('testurl', True)
+    assert cache.get('testurl') is None
+    assert len(cache) == 0
+
+
+def test_cache_bounded():
+    cache = LivenessCache(max_size=2)
+    for url in ['a', 'b', 'c']:
+        cache.set(url, True)
+    assert len(cache) == 2
+    assert cache.get('a') is None
+    cache.set('b', False)
+    cache.set('d', True)
+    assert [cache.get(url) for url in 'bcd'] == [False, None, True]
+
+
+def test_cache_purges_expired():
+    cache = LivenessCache()
+    cache.set('a', True)
+    cache.set('b', True)
+    cache._entries['a'] = (True, 0)
+    cache.set('c', True)
+    assert list(cache._entries) == ['b', 'c']
+
+
+def test_plowprobe(monkeypatch):
+    def check_output(command, **kwargs):
+        raise subprocess.CalledProcessError(
+            {'dead': liveness.ERR_LINK_DEAD}.get(command[1], 1), command[0])
+
+    monkeypatch.setattr(subprocess, 'check_output', check_output)
+    assert liveness.plowprobe({'host_name': 'rghost', 'url': 'dead'}) is False
+    assert liveness.plowprobe({'host_name': 'rghost', 'url': 'down'}) is None
+
+    monkeypatch.setattr(subprocess, 'check_output', lambda *a, **k: '')
+    assert liveness.plowprobe(SOURCE) is True
+
+
+def test_head(monkeypatch):
+    def urlopen(request, timeout):
+        assert request.get_method() == 'HEAD'
+        raise liveness.HTTPError(request.get_full_url(), 404, '', {}, None)
+
+    monkeypatch.setattr(liveness, 'urlopen', urlopen)
+    assert liveness.head(SOURCE) is False
+
+
+def test_rate_limiter():
+    limiter = HostRateLimiter(rate=20)
+    start = time.time()
+    for _ in range(3):
+        limiter.wait('rghost')
+    limiter.wait('ge_tt')
+    assert time.time() - start >= 0.1
+
+
+def test_prober_cached():
+    calls = []
+
+    def backend(source):
+        calls.append(source)
+        return source['url'] != 'dead'
+
+    prober = LivenessProber(backend, rate=1000)
+    sources = [SOURCE, {'host_name': 'ge_tt', 'url': 'dead'}]
+    assert prober.probe(sources) == [(sources[0], True), (sources[1], False)]
+    assert prober.probe(sources) == [(sources[0], True), (sources[1], False)]
+    assert calls == sources
@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Storj Labs
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import os
+import sys
+import tempfile
+import threading
+
+import pytest
+from plowshare import compression
+from plowshare import pipeline
+from plowshare import store
+from plowshare.plowshare import Plowshare
+
+
+@pytest.fixture
+def files(tmpdir):
+    paths = []
+    for name, content in [('text', b'plowshare ' * 10000),
+                          ('random', os.urandom(100000))]:
+        path = tmpdir.join(name)
+        path.write_binary(content)
+        paths.append(str(path))
+    return paths
+
+
+@pytest.fixture
+def uploads(monkeypatch):
+    uploaded = []
+
+    def upload(self, filename, number_of_hosts):
+        with open(filename, 'rb') as f:
+            uploaded.append(f.read())
+        return [{'host_name': 'host%d' % i, 'url': 'http://%s' % filename}
+                for i in range(number_of_hosts)]
+
+    monkeypatch.setattr(Plowshare, '_upload_with_spares', upload)
+    return uploaded
+
+
+def test_prepare_compresses(files, tmpdir):
+    directory = str(tmpdir.mkdir('work'))
+    prepared = pipeline.prepare(files[0], directory)
+    assert prepared['hash'] == store.content_hash(files[0])
+    assert prepared['size'] == 100000
+    assert prepared['codec'] in compression.codecs
+    assert prepared['payload'].startswith(directory)
+    assert os.path.basename(prepared['payload']) == \
+        'text.' + prepared['codec']
+
+
+def test_prepare_random_or_uncompressed(files, tmpdir):
+    directory = str(tmpdir.mkdir('work'))
+    for prepared in [pipeline.prepare(files[1], directory),
+                     pipeline.prepare(files[0], directory, False)]:
+        assert prepared['payload'] == prepared['filename']
+        assert 'codec' not in prepared
+
+
+def test_prepare_error(tmpdir):
+    prepared = pipeline.prepare(str(tmpdir.join('missing')), str(tmpdir))
+    assert prepared['filename'] == str(tmpdir.join('missing'))
+    assert 'error' in prepared
+
+
+def test_upload(files, uploads):
+    results = list(pipeline.Pipeline(Plowshare(), processes=2).upload(
+        files, 2))
+    assert sorted(result['filename'] for result in results) == sorted(files)
+    for result in results:
+        assert result['hash'] == store.content_hash(result['filename'])
+        assert len(result['sources']) == 2
+    text = [r for r in results if r['filename'] == files[0]][0]
+    assert all('codec' in source for source in text['sources'])
+    assert sorted(len(upload) for upload in uploads)[0] < 100000
+    with open(files[1], 'rb') as f:
+        assert f.read() in uploads
+
+
+def test_upload_removes_payloads(files, uploads, monkeypatch, tmpdir):
+    directory = tmpdir.mkdir('work')
+    monkeypatch.setattr(tempfile, 'tempdir', str(directory))
+    list(pipeline.Pipeline(Plowshare(), processes=1).upload(files, 1))
+    assert directory.listdir() == []
+
+
+def test_upload_errors(files, uploads, tmpdir):
+    missing = str(tmpdir.join('missing'))
+    results = list(pipeline.Pipeline(Plowshare(), processes=1).upload(
+        [missing, files[1]], 1))
+    assert len(results) == 2
+    assert [r for r in results if r['filename'] == missing][0]['error']
+    assert len(uploads) == 1
+
+
+def test_upload_transfer_error(files, monkeypatch):
+    def fail(self, filename, number_of_hosts):
+        raise ValueError('Sample larger than population')
+
+    monkeypatch.setattr(Plowshare, '_upload_with_spares', fail)
+    results = list(pipeline.Pipeline(Plowshare(), processes=1).upload(
+        files, 1))
+    assert [r['error'] for r in results] == \
+        ['Sample larger than population'] * 2
+
+
+def test_upload_empty():
+    assert list(pipeline.Pipeline(Plowshare(), processes=1).upload(
+        [], 1)) == []
+
+
+def test_upload_backpressure(tmpdir, monkeypatch):
+    release = threading.Event()
+    fed = []
+
+    def upload(self, filename, number_of_hosts):
+        release.wait()
+        return []
+
+    def filenames():
+        for i in range(10):
+            path = tmpdir.join(str(i))
+            path.write_binary(b'x')
+            fed.append(str(path))
+            yield str(path)
+
+    monkeypatch.setattr(Plowshare, '_upload_with_spares', upload)
+    results = pipeline.Pipeline(Plowshare(), processes=1, transfers=1,
+                                size=3, compress=False).upload(filenames(), 1)
+    thread = threading.Thread(target=lambda: fed.append(list(results)))
+    thread.start()
+    try:
+        threading.Event().wait(0.5)
+        # Three files are in the pipeline, the feeder waits with a fourth
+        assert len(fed) == 4
+    finally:
+        release.set()
+        thread.join()
+    assert len(fed[-1]) == 10
+
+
+def test_upload_filenames_error(files, uploads):
+    def filenames():
+        yield files[1]
+        raise IOError('listing failed')
+
+    results = pipeline.Pipeline(Plowshare(), processes=1).upload(
+        filenames(), 1)
+    assert next(results)['filename'] == files[1]
+    with pytest.raises(IOError):
+        next(results)
+
+
+def fail(filename, directory, compress):
+    raise ValueError('prepare failed')
+
+
+def test_upload_prepare_raises(files, uploads):
+    results = list(pipeline.Pipeline(
+        Plowshare(), processes=1, size=1, prepare=fail).upload(files, 1))
+    assert [r['error'] for r in results] == ['prepare failed'] * 2
+    assert uploads == []
+
+
+@pytest.mark.skipif(sys.version_info[0] < 3,
+                    reason='Python 2 pools have no error_callback')
+def test_upload_prepare_unpicklable(files, uploads):
+    results = list(pipeline.Pipeline(
+        Plowshare(), processes=1, size=1,
+        prepare=lambda *a: {}).upload(files, 1))
+    assert [r['filename'] for r in results] == files
+    assert all('error' in r for r in results)
+
+
+def test_upload_closed_early(tmpdir, monkeypatch):
+    release, uploaded, fed = threading.Event(), [], []
+    directory = tmpdir.mkdir('work')
+    monkeypatch.setattr(tempfile, 'tempdir', str(directory))
+
+    def upload(self, filename, number_of_hosts):
+        if uploaded:
+            release.wait(5)
+        uploaded.append(filename)
+        return []
+
+    def filenames():
+        for i in range(20):
+            path = tmpdir.join(str(i))
+            path.write_binary(b'x')
+            fed.append(str(path))
+            yield str(path)
+
+    monkeypatch.setattr(Plowshare, '_upload_with_spares', upload)
+    results = pipeline.Pipeline(Plowshare(), processes=1, transfers=1,
+                                size=3, compress=False).upload(filenames(), 1)
+    assert next(results)['filename'] == fed[0]
+    while len(fed) < 5:
+        threading.Event().wait(0.01)
+    results.close()
+    release.set()
+
+    while directory.listdir():
+        threading.Event().wait(0.01)
+    # The upload running when closing finishes, queued files are dropped,
+    # and the feeder stops reading filenames
+    threading.Event().wait(0.2)
+    assert len(uploaded) == 2
+    assert len(fed) == 5
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Storj Labs
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import errno
+import os
+
+import pytest
+from plowshare import placement
+
+
+def test_temporary_path():
+    path = placement.temporary_path('/tmp/out/file.tgz')
+    assert os.path.dirname(path) == '/tmp/out'
+    assert os.path.basename(path).startswith('.file.tgz.')
+
+
+def test_placement_commit(tmpdir):
+    destination = str(tmpdir.join('file'))
+    with placement.Placement(destination, 4) as output:
+        assert os.fstat(output.fd).st_size == 4
+        os.write(output.fd, b'data')
+        output.commit()
+    assert tmpdir.join('file').read_binary() == b'data'
+    assert tmpdir.listdir() == [tmpdir.join('file')]
+
+
+def test_placement_abort(tmpdir):
+    destination = str(tmpdir.join('file'))
+    with pytest.raises(RuntimeError):
+        with placement.Placement(destination, 4):
+            raise RuntimeError()
+    with placement.Placement(destination, 4):
+        pass
+    assert tmpdir.listdir() == []
+
+
+def test_move_cross_device(tmpdir, monkeypatch):
+    source = tmpdir.join('source')
+    source.write_binary(b'x' * 1000)
+    rename = os.rename
+
+    def cross_device_rename(src, dst):
+        if src == str(source):
+            raise OSError(errno.EXDEV, 'Invalid cross-device link')
+        rename(src, dst)
+
+    monkeypatch.setattr(os, 'rename', cross_device_rename)
+    placement.move(str(source), str(tmpdir.join('destination')))
+    assert tmpdir.join('destination').read_binary() == b'x' * 1000
+    assert tmpdir.listdir() == [tmpdir.join('destination')]
+
+
+def test_copy_file_buffered(tmpdir, monkeypatch):
+    monkeypatch.delattr(os, 'copy_file_range', raising=False)
+    monkeypatch.delattr(os, 'sendfile', raising=False)
+    tmpdir.join('source').write_binary(b'data')
+    src = os.open(str(tmpdir.join('source')), os.O_RDONLY)
+    dst = os.open(str(tmpdir.join('destination')), os.O_WRONLY | os.O_CREAT)
+    try:
+        placement.copy_file(src, dst, 4)
+    finally:
+        os.close(src)
+        os.close(dst)
+    assert tmpdir.join('destination').read_binary() == b'data'
+
+
+def test_copy_file_short(tmpdir, monkeypatch):
+    monkeypatch.setattr(os, 'copy_file_range', lambda *a: 0, raising=False)
+    monkeypatch.setattr(os, 'sendfile', lambda *a: 0, raising=False)
+    tmpdir.join('source').write_binary(b'data')
+    src = os.open(str(tmpdir.join('source')), os.O_RDONLY)
+    dst = os.open(str(tmpdir.join('destination')), os.O_WRONLY | os.O_CREAT)
+    try:
+        placement.copy_file(src, dst, 4)
+        with pytest.raises(IOError):
+            placement.copy_file(src, dst, 8)
+    finally:
+        os.close(src)
+        os.close(dst)
+    assert tmpdir.join('destination').read_binary() == b'data'
@@ -23,6 +23,8 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+import os
+
 import pytest
 from plowshare.plowshare import Plowshare
 
@@ -197,10 +199,102 @@ def test_download_failover(plowinst, patch_multiprocessing,
     assert result == {'host_name': 'multiupload', 'filename': 'test/test.tgz'}
 
 
-def test_upload(plowinst, patch_plow_multiupload):
+def test_upload(plowinst, patch_plow_upload_to_host):
     result = plowinst.upload('test.tgz', 3)
     assert result == [
-        {'host_name': 'rghost', 'url': 'http://rghost.net/57830097'}]
+        {'host_name': 'rghost', 'url': 'http://rghost.net/57830097'}] * 3
+
+
+def test_upload_spares(plowinst, patch_rnd_sample, patch_subprocess_exc):
+    plowinst.hosts = ['ge_tt', 'multiupload', 'rghost']
+    result = plowinst.upload('fail', 1)
+    assert result == []
+    assert plowinst._host_errors == {
+        'ge_tt': 1, 'multiupload': 1, 'rghost': 1}
+
+
+def test_replicate_failover(plowinst, monkeypatch):
+    def upload_to_host(self, filename, host):
+        if host == 'ge_tt':
+            return {'host_name': host, 'error': 'testerror'}
+        return {'host_name': host, 'url': 'testurl'}
+
+    monkeypatch.setattr(Plowshare, 'upload_to_host', upload_to_host)
+    result = plowinst.replicate('test.tgz', ['ge_tt'], ['rghost'], 1)
+    assert result == [{'host_name': 'rghost', 'url': 'testurl'}]
+    assert plowinst._host_errors['ge_tt'] == 1
+
+
+def test_replicate_exception(plowinst, monkeypatch):
+    def upload_to_host(self, filename, host):
+        if host == 'ge_tt':
+            raise IndexError('list index out of range')
+        return {'host_name': host, 'url': 'testurl'}
+
+    monkeypatch.setattr(Plowshare, 'upload_to_host', upload_to_host)
+    result = plowinst.replicate('test.tgz', ['ge_tt'], ['rghost'], 1)
+    assert result == [{'host_name': 'rghost', 'url': 'testurl'}]
+    assert plowinst._host_errors['ge_tt'] == 1
+    assert plowinst.replicate('test.tgz', ['ge_tt'], [], 1) == []
+
+
+def test_replicate_straggler(plowinst, monkeypatch):
+    import threading
+    monkeypatch.setattr('plowshare.settings.STRAGGLER_CHECK_INTERVAL', 0.01)
+    release = threading.Event()
+
+    def upload_to_host(self, filename, host):
+        if host == 'ge_tt':
+            release.wait(5)
+        return {'host_name': host, 'url': 'testurl'}
+
+    monkeypatch.setattr(Plowshare, 'upload_to_host', upload_to_host)
+    monkeypatch.setattr(plowinst.concurrency, 'rate', lambda host: 1e9)
+    try:
+        result = plowinst.replicate(
+            __file__, ['ge_tt', 'rghost'], ['multiupload'], 2)
+    finally:
+        release.set()
+    assert sorted(r['host_name'] for r in result) == [
+        'multiupload', 'rghost']
+
+
+def test_replicate_cancels_leftovers(plowinst, monkeypatch):
+    import threading
+    import time
+    from plowshare import settings
+    monkeypatch.setattr('plowshare.settings.STRAGGLER_CHECK_INTERVAL', 0.01)
+    release, commands = threading.Event(), []
+
+    def run_command(self, command, **kwargs):
+        commands.append(command[1])
+        if command[1] == 'ge_tt':
+            release.wait(5)
+            return {'error': 'file is gone'}
+        return {'output': 'testurl'}
+
+    monkeypatch.setattr(Plowshare, '_run_command', run_command)
+    monkeypatch.setattr(plowinst.concurrency, 'rate', lambda host: 1e9)
+    # The spare has to wait for a slot, held by another transfer
+    busy = plowinst.concurrency.limit('multiupload')
+    busy.limit = 1.0
+    busy.acquire()
+
+    try:
+        result = plowinst.replicate(
+            __file__, ['ge_tt', 'rghost'], ['multiupload'], 2,
+            deadline=time.time() + 0.3)
+    finally:
+        release.set()
+    assert result == [{'host_name': 'rghost', 'url': 'testurl'}]
+
+    straggler = plowinst.concurrency.limit('ge_tt')
+    while straggler.in_flight:
+        time.sleep(0.01)
+    assert 'multiupload' not in commands
+    assert (busy.in_flight, busy._waiting) == (1, [])
+    assert straggler.limit == settings.AIMD_INITIAL_LIMIT
+    assert dict(plowinst._host_errors) == {}
 
 
 def test_multiupload(plowinst, patch_multiprocessing,
@@ -239,3 +333,391 @@ def test_filter_sources(patch_plow_host_errors):
         {'host_name': 'rghost', 'url': 'testurl'},
         {'host_name': 'multiupload', 'url': 'testurl'}
     ]
+
+
+def test_swarm_download(plowinst, monkeypatch, tmpdir):
+    content = b'0123456789'
+    monkeypatch.setattr(Plowshare, 'resolve_direct_link', lambda self, s: {
+        'host_name': s['host_name'], 'link': s['url']})
+    monkeypatch.setattr(Plowshare, 'remote_size',
+                        lambda self, link: len(content))
+
+    def fetch_range(self, link, offset, length):
+        if link == 'fail':
+            return None
+        return content[offset:offset + length]
+
+    monkeypatch.setattr(Plowshare, 'fetch_range', fetch_range)
+
+    sources = [
+        {'host_name': 'rghost', 'url': 'testurl'},
+        {'host_name': 'ge_tt', 'url': 'fail'},
+    ]
+    result = plowinst.download(sources, str(tmpdir), 'test.tgz', swarm=True)
+    assert result == {'host_name': 'rghost', 'host_names': ['rghost'],
+                      'filename': str(tmpdir.join('test.tgz'))}
+    assert tmpdir.join('test.tgz').read_binary() == content
+
+
+def test_remote_size(plowinst, monkeypatch):
+    import subprocess
+    headers = {'ok': 'HTTP/1.1 302 Found\r\nContent-Length: 0\r\n\r\n'
+                     'HTTP/1.1 200 OK\r\nContent-Length: 10\r\n',
+               'bad': 'HTTP/1.1 200 OK\r\nContent-Length: ten\r\n',
+               'none': 'HTTP/1.1 200 OK\r\n'}
+    monkeypatch.setattr(subprocess, 'check_output',
+                        lambda args, **kwargs: headers[args[-1]])
+    assert plowinst.remote_size('ok') == 10
+    assert plowinst.remote_size('bad') is None
+    assert plowinst.remote_size('none') is None
+
+
+def test_swarm_download_error(plowinst, monkeypatch, tmpdir):
+    monkeypatch.setattr(Plowshare, 'resolve_direct_link', lambda self, s: {
+        'host_name': s['host_name'], 'link': s['url']})
+    monkeypatch.setattr(Plowshare, 'fetch_range', lambda *a: None)
+    monkeypatch.setattr(Plowshare, 'download_from_host', lambda self, s, *a: {
+        'host_name': s['host_name'], 'error': 'testerror'})
+
+    sources = [
+        {'host_name': 'rghost', 'url': 'testurl', 'size': 10},
+        {'host_name': 'ge_tt', 'url': 'testurl', 'size': 10},
+    ]
+    result = plowinst.swarm_download(sources, str(tmpdir), 'test.tgz', 4)
+    assert result == {}
+    assert not tmpdir.join('test.tgz').check()
+    assert plowinst._host_errors['rghost'] == 1
+    assert plowinst._host_errors['ge_tt'] == 1
+
+
+def test_swarm_download_ranges_fail(plowinst, monkeypatch, tmpdir):
+    monkeypatch.setattr(Plowshare, 'resolve_direct_link', lambda self, s: {
+        'host_name': s['host_name'], 'link': s['url']})
+    monkeypatch.setattr(Plowshare, 'fetch_range', lambda *a: None)
+    monkeypatch.setattr(Plowshare, 'download_from_host', lambda self, s, *a: {
+        'host_name': s['host_name'], 'filename': 'test.tgz'})
+
+    sources = [
+        {'host_name': 'rghost', 'url': 'testurl', 'size': 10},
+        {'host_name': 'ge_tt', 'url': 'testurl', 'size': 10},
+    ]
+    initial = plowinst.concurrency.limit('rghost').limit
+    result = plowinst.swarm_download(sources, str(tmpdir), 'test.tgz', 4)
+    assert result['filename'] == 'test.tgz'
+    assert not any(plowinst._host_errors.values())
+    assert plowinst.concurrency.limit('rghost').limit == initial
+
+
+def test_swarm_download_fallback(plowinst, patch_multiprocessing,
+                                 patch_subprocess_exc,
+                                 patch_plow_download_from_host):
+    result = plowinst.swarm_download(
+        [{'host_name': 'rghost', 'url': 'testurl'}], 'test', 'test.tgz')
+    assert result == {'filename': 'test/test.tgz', 'host_name': 'rghost'}
+
+
+def test_upload_compressed(plowinst, patch_rnd_sample, monkeypatch, tmpdir):
+    path = tmpdir.join('log.txt')
+    path.write('everything is fine\n' * 10000)
+    uploaded = []
+
+    def upload_to_host(self, filename, host):
+        uploaded.append(filename)
+        return {'host_name': host, 'url': 'testurl'}
+
+    monkeypatch.setattr(Plowshare, 'upload_to_host', upload_to_host)
+    result = plowinst.upload(str(path), 1, compress=True)
+    codec = result[0]['codec']
+    assert result == [{'host_name': 'ge_tt', 'url': 'testurl',
+                       'codec': codec}]
+    assert uploaded[0].endswith('log.txt.' + codec)
+    assert not os.path.exists(uploaded[0])
+
+
+def test_download_decompressed(plowinst, monkeypatch, tmpdir):
+    import io
+    import subprocess
+    import zlib
+
+    class MockProcess(object):
+        def __init__(self, *args, **kwargs):
+            self.stdout = io.BytesIO(zlib.compress(b'content'))
+            self.returncode = 0
+
+        def wait(self):
+            return self.returncode
+
+        def poll(self):
+            return self.returncode
+
+    monkeypatch.setattr(subprocess, 'Popen', MockProcess)
+    monkeypatch.setattr(Plowshare, 'resolve_direct_link', lambda self, s: {
+        'host_name': s['host_name'], 'link': s['url']})
+
+    source = {'host_name': 'rghost', 'url': 'testurl', 'codec': 'zlib'}
+    result = plowinst.download_from_host(source, str(tmpdir), 'test.tgz')
+    assert result == {'host_name': 'rghost',
+                      'filename': str(tmpdir.join('test.tgz'))}
+    assert tmpdir.join('test.tgz').read_binary() == b'content'
+
+
+def test_random_hosts_size(plowinst, patch_rnd_sample):
+    from plowshare.hosts import HostRegistry
+    plowinst.registry = HostRegistry.from_dict(
+        {'ge_tt': {'max_file_size': 10}})
+    assert plowinst.random_hosts(2, 100) == ['multiupload', 'rghost']
+
+
+def test_random_hosts_size_error(plowinst):
+    from plowshare.hosts import HostRegistry
+    plowinst.registry = HostRegistry.from_dict(
+        {'ge_tt': {'max_file_size': 10}})
+    with pytest.raises(ValueError):
+        plowinst.random_hosts(3, 100)
+
+
+def test_multiupload_size(plowinst, patch_multiprocessing,
+                          patch_subprocess, tmpdir):
+    from plowshare.hosts import HostRegistry
+    plowinst.registry = HostRegistry.from_dict(
+        {'rghost': {'max_file_size': 10}})
+    path = tmpdir.join('test.tgz')
+    path.write('x' * 100)
+    assert plowinst.multiupload(str(path), ['rghost']) == []
+
+
+def test_upload_to_host_concurrency(plowinst, patch_subprocess_exc):
+    plowinst.upload_to_host('fasd.tar.gz', 'rghost')
+    limit = plowinst.concurrency.limit('rghost')
+    assert limit.in_flight == 0
+    before = limit.limit
+    plowinst.upload_to_host('fail', 'rghost')
+    assert limit.limit < before
+
+
+def test_filter_sources_liveness(plowinst):
+    sources = [
+        {'host_name': 'rghost', 'url': 'testurl'},
+        {'host_name': 'multiupload', 'url': 'dead'},
+        {'host_name': 'ge_tt', 'url': 'alive'},
+        {'host_name': 'ge_tt', 'error': 'testerror'},
+    ]
+    probed = plowinst.probe_sources(
+        sources[1:], lambda s: s['url'] == 'alive')
+    assert [alive for _, alive in probed] == [False, True]
+
+    assert plowinst._filter_sources(sources) == [
+        {'host_name': 'ge_tt', 'url': 'alive'},
+        {'host_name': 'rghost', 'url': 'testurl'},
+    ]
+
+
+def test_filter_sources_retention(plowinst):
+    import time
+    from plowshare.hosts import HostRegistry
+    plowinst.registry = HostRegistry.from_dict(
+        {'ge_tt': {'retention': 60}, 'rghost': {'retention': 60}})
+    now = time.time()
+    sources = [
+        {'host_name': 'ge_tt', 'url': 'expired', 'uploaded_at': now - 120},
+        {'host_name': 'rghost', 'url': 'probed', 'uploaded_at': now - 120},
+        {'host_name': 'rghost', 'url': 'fresh', 'uploaded_at': now - 30},
+        {'host_name': 'multiupload', 'url': 'unknown', 'uploaded_at': 0},
+    ]
+    plowinst.liveness.set('probed', True)
+    assert [s['url'] for s in plowinst._filter_sources(sources)] == [
+        'probed', 'fresh', 'unknown', 'expired']
+
+
+def test_coordinated(patch_subprocess_exc):
+    from plowshare import coordination
+    coordinator = coordination.LocalCoordinator(threshold=1)
+    inst = Plowshare(['ge_tt', 'multiupload', 'rghost'],
+                     coordinator=coordinator)
+    coordinator.begin('ge_tt')
+    coordinator.end('ge_tt', False)
+    coordinator.begin('multiupload')
+
+    assert inst._hosts_by_success() == ['rghost', 'multiupload', 'ge_tt']
+    assert sorted(inst.random_hosts(2)) == ['multiupload', 'rghost']
+
+    inst.upload_to_host('fail', 'rghost')
+    assert coordinator.snapshot()['rghost'] == {
+        'errors': 1, 'circuit': coordination.OPEN, 'in_flight': 0}
+
+
+def test_rendezvous_hosts(plowinst):
+    from plowshare import rendezvous
+    ranking = rendezvous.rank('key', plowinst.hosts)
+    assert plowinst.rendezvous_hosts('key') == ranking
+    assert plowinst.locate('key') == ranking
+
+    plowinst._host_errors[ranking[0]] = 10
+    assert plowinst.rendezvous_hosts('key') == ranking[1:] + ranking[:1]
+    assert plowinst.locate('key') == ranking
+
+
+def test_upload_rendezvous(plowinst, tmpdir):
+    from plowshare.store import content_hash
+    path = tmpdir.join('test.tgz')
+    path.write('content')
+    hosts = []
+    plowinst.replicate = lambda filename, h, *args: hosts.extend(h)
+    plowinst.upload(str(path), 2, rendezvous=True)
+    assert hosts == plowinst.locate(content_hash(str(path)))[:2]
+
+
+def test_download_deadline(plowinst, patch_multiprocessing,
+                           patch_plow_download_from_host):
+    import time
+    plowinst.concurrency.limit('rghost').rate = 10.0
+    plowinst.concurrency.limit('ge_tt').rate = 1000.0
+    sources = [
+        {'host_name': 'rghost', 'url': 'testurl', 'size': 1000},
+        {'host_name': 'ge_tt', 'url': 'testurl', 'size': 1000},
+    ]
+    attempted = []
+    download_from_host = plowinst.download_from_host
+    plowinst.download_from_host = lambda source, *a: \
+        attempted.append(source['host_name']) or download_from_host(
+            source, *a)
+
+    plowinst.download(sources, 'test', 'test.tgz', deadline=time.time() + 5)
+    assert attempted == ['ge_tt']
+    assert plowinst.download(sources, 'test', 'test.tgz',
+                             deadline=time.time()) == {
+        'error': 'deadline exceeded'}
+
+
+def test_schedule_download(plowinst, patch_multiprocessing,
+                           patch_plow_download_from_host):
+    import time
+    ticket = plowinst.schedule_download(
+        [{'host_name': 'rghost', 'url': 'testurl'}], 'test', 'test.tgz',
+        deadline=time.time() + 5, priority=1)
+    assert ticket.wait(5) == {'filename': 'test/test.tgz',
+                              'host_name': 'rghost'}
+
+
+def test_download_deadline_unknown_size(plowinst, patch_multiprocessing,
+                                        patch_plow_download_from_host):
+    import time
+    plowinst.concurrency.limit('rghost').rate = 10.0
+    sources = [{'host_name': 'rghost', 'url': 'testurl'}]
+    assert plowinst._estimate(['rghost'], None) is None
+    assert plowinst.download(sources, 'test', 'test.tgz',
+                             deadline=time.time() + 5) == {
+        'filename': 'test/test.tgz', 'host_name': 'rghost'}
+    ticket = plowinst.schedule_download(sources, 'test', 'test.tgz',
+                                        deadline=time.time() + 5)
+    assert ticket.wait(5) == {'filename': 'test/test.tgz',
+                              'host_name': 'rghost'}
+
+
+def test_upload_priority(plowinst, monkeypatch):
+    import time
+    urgencies = []
+
+    def upload_to_host(self, filename, host):
+        urgencies.append(self._current_urgency())
+        return {'host_name': host, 'url': 'testurl'}
+
+    monkeypatch.setattr(Plowshare, 'upload_to_host', upload_to_host)
+    deadline = time.time() + 60
+    plowinst.upload('test.tgz', 2, deadline=deadline, priority=2)
+    assert urgencies == [(2, deadline)] * 2
+    assert plowinst._current_urgency() == (0, None)
+
+
+def test_swarm_download_urgency(plowinst, monkeypatch):
+    import time
+    urgencies = []
+
+    def download_from_host(self, source, output_directory, filename):
+        urgencies.append(self._current_urgency())
+        return {'host_name': source['host_name'], 'filename': filename}
+
+    monkeypatch.setattr(Plowshare, 'download_from_host', download_from_host)
+    deadline = time.time() + 60
+    sources = [{'host_name': 'rghost', 'url': 'testurl'}]
+    assert plowinst.download(sources, 'test', 'test.tgz', swarm=True,
+                             deadline=deadline, priority=7) == {
+        'host_name': 'rghost', 'filename': 'test.tgz'}
+    assert urgencies == [(7, deadline)]
+
+    plowinst.concurrency.limit('rghost').rate = 1.0
+    sources[0]['size'] = 10 ** 9
+    assert plowinst.download(sources, 'test', 'test.tgz', swarm=True,
+                             deadline=time.time() + 1) == {
+        'error': 'deadline exceeded'}
+    assert len(urgencies) == 1
+
+
+def test_schedule_upload_doomed(plowinst, tmpdir):
+    import time
+    path = tmpdir.join('test.tgz')
+    path.write('x' * 1000)
+    for host in plowinst.hosts:
+        plowinst.concurrency.limit(host).rate = 10.0
+    ticket = plowinst.schedule_upload(str(path), 2,
+                                      deadline=time.time() + 5)
+    assert ticket.wait(1) == []
+
+
+def test_upload_bundle(plowinst, patch_rnd_sample, monkeypatch, tmpdir):
+    paths = []
+    for name in ('a.json', 'b.log'):
+        tmpdir.join(name).write('content')
+        paths.append(str(tmpdir.join(name)))
+    uploaded = []
+
+    def upload_to_host(self, filename, host):
+        uploaded.append(host)
+        return {'host_name': host, 'url': 'testurl'}
+
+    monkeypatch.setattr(Plowshare, 'upload_to_host', upload_to_host)
+    result = plowinst.upload_bundle(paths, 2)
+    assert sorted(uploaded) == ['ge_tt', 'multiupload']
+    assert sorted(result) == paths
+    assert [s['length'] for s in result[paths[0]]] == [7, 7]
+    assert result[paths[0]][0]['offset'] < result[paths[1]][0]['offset']
+
+
+def test_download_member_range(plowinst, monkeypatch, tmpdir):
+    monkeypatch.setattr(Plowshare, 'resolve_direct_link', lambda self, s: {
+        'host_name': s['host_name'], 'link': s['url']})
+    monkeypatch.setattr(Plowshare, 'fetch_range',
+                        lambda self, link, offset, length: b'x' * length)
+
+    source = {'host_name': 'rghost', 'url': 'testurl',
+              'offset': 512, 'length': 3}
+    result = plowinst.download([source], str(tmpdir), 'member')
+    assert result == {'host_name': 'rghost',
+                      'filename': str(tmpdir.join('member'))}
+    assert tmpdir.join('member').read_binary() == b'xxx'
+
+
+def test_download_member_fallback(plowinst, monkeypatch, tmpdir):
+    from plowshare import bundle
+    from plowshare.hosts import HostRegistry
+    tmpdir.join('a').write('abc')
+    tmpdir.join('b').write('member')
+    members = bundle.pack([str(tmpdir.join('a')), str(tmpdir.join('b'))],
+                          str(tmpdir.join('bundle.tar')))
+    plowinst.registry = HostRegistry.from_dict(
+        {'rghost': {'supports_range': False}})
+
+    def plowdown(self, source, output_directory, filename):
+        path = os.path.join(output_directory, filename)
+        tmpdir.join('bundle.tar').copy(tmpdir.join(os.path.relpath(
+            path, str(tmpdir))))
+        return {'host_name': source['host_name'], 'filename': path}
+
+    monkeypatch.setattr(Plowshare, '_plowdown', plowdown)
+    source = {'host_name': 'rghost', 'url': 'testurl',
+              'offset': members[1]['offset'], 'length': 6}
+    output = tmpdir.mkdir('output')
+    result = plowinst.download_from_host(source, str(output), 'b')
+    assert result == {'host_name': 'rghost', 'filename': str(output.join('b'))}
+    assert output.join('b').read() == 'member'
+    assert output.listdir() == [output.join('b')]
@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Storj Labs
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from plowshare.rendezvous import rank, score
+
+HOSTS = ['euroshare_eu', 'ge_tt', 'gfile_ru', 'multiupload', 'rghost',
+         'zalil_ru']
+KEYS = ['%064x' % i for i in range(600)]
+
+
+def test_score_deterministic():
+    assert score('key', 'rghost') == score('key', 'rghost')
+    assert score('key', 'rghost', 2.0) == 2 * score('key', 'rghost')
+    assert score('key', 'rghost') != score('key', 'ge_tt')
+
+
+def test_rank_is_permutation():
+    assert sorted(rank('key', HOSTS)) == sorted(HOSTS)
+    assert rank('key', HOSTS) == rank('key', list(reversed(HOSTS)))
+
+
+def test_minimal_disruption():
+    before = dict((key, rank(key, HOSTS)[0]) for key in KEYS)
+    after = dict((key, rank(key, HOSTS[:-1])[0]) for key in KEYS)
+    moved = [key for key in KEYS if before[key] != after[key]]
+    # Only the keys placed on the removed host move.
+    assert moved == [key for key in KEYS if before[key] == HOSTS[-1]]
+
+
+def test_weights():
+    first = [rank(key, HOSTS, {'rghost': 5.0})[0] for key in KEYS]
+    assert first.count('rghost') > len(KEYS) / 3
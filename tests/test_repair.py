@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Storj Labs
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import pytest
+from plowshare.plowshare import Plowshare
+from plowshare.repair import Repairer
+
+
+def alive(source):
+    return not source['url'].startswith('dead')
+
+
+@pytest.fixture
+def manifests():
+    return [
+        {'hash': 'healthy', 'sources': [
+            {'host_name': 'rghost', 'url': 'a1'},
+            {'host_name': 'ge_tt', 'url': 'a2'},
+        ]},
+        {'hash': 'decayed', 'sources': [
+            {'host_name': 'rghost', 'url': 'b1'},
+            {'host_name': 'ge_tt', 'url': 'dead-b2'},
+        ]},
+        {'hash': 'lost', 'sources': [
+            {'host_name': 'rghost', 'url': 'dead-c1'},
+            {'host_name': 'ge_tt', 'error': 'testerror'},
+        ]},
+    ]
+
+
+@pytest.fixture
+def repairer():
+    plowshare = Plowshare(['ge_tt', 'multiupload', 'rghost'])
+    return Repairer(plowshare, copies=2, backend=alive, interval=0)
+
+
+def test_plan(repairer, manifests):
+    plan = repairer.plan(manifests)
+    assert [(m['hash'], len(live)) for m, live in plan] == [
+        ('lost', 0), ('decayed', 1)]
+
+
+def test_repair(repairer, manifests, monkeypatch):
+    downloads = []
+
+    def download(self, sources, output_directory, filename):
+        downloads.append(sources)
+        path = output_directory + '/' + filename
+        open(path, 'w').close()
+        return {'host_name': sources[0]['host_name'], 'filename': path}
+
+    def replicate(self, filename, hosts, spares, copies):
+        return [{'host_name': host, 'url': 'new'} for host in hosts]
+
+    monkeypatch.setattr(Plowshare, 'download', download)
+    monkeypatch.setattr(Plowshare, 'replicate', replicate)
+
+    result = list(repairer.repair(manifests))
+    assert result == [
+        dict(manifests[2], error='no live sources'),
+        {'hash': 'decayed', 'sources': [
+            {'host_name': 'rghost', 'url': 'b1'},
+            {'host_name': 'ge_tt', 'url': 'new'},
+        ]},
+    ]
+    assert downloads == [[{'host_name': 'rghost', 'url': 'b1'}]]
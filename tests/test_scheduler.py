@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Storj Labs
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import threading
+import time
+
+import pytest
+from plowshare.scheduler import Scheduler
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = Scheduler(workers=1)
+    yield scheduler
+    scheduler.close()
+
+
+def test_submit(scheduler):
+    ticket = scheduler.submit(lambda a, b=0: a + b, (1,), {'b': 2})
+    assert ticket.wait(1) == 3
+    assert ticket.done()
+
+
+def test_error(scheduler):
+    def fail():
+        raise RuntimeError('testerror')
+
+    assert scheduler.submit(fail).wait(1) == {'error': 'testerror'}
+
+
+def test_order(scheduler):
+    started, release, order = threading.Event(), threading.Event(), []
+    scheduler.submit(lambda: started.set() or release.wait(1))
+    started.wait(1)
+    now = time.time()
+    tickets = [
+        scheduler.submit(order.append, ('late',), deadline=now + 20),
+        scheduler.submit(order.append, ('none',)),
+        scheduler.submit(order.append, ('early',), deadline=now + 10),
+        scheduler.submit(order.append, ('urgent',), priority=1),
+    ]
+    release.set()
+    for ticket in tickets:
+        ticket.wait(1)
+    assert order == ['urgent', 'early', 'late', 'none']
+
+
+def test_doomed_on_submit(scheduler):
+    ticket = scheduler.submit(lambda: {}, deadline=time.time() + 1,
+                              estimate=lambda: 10)
+    assert ticket.done()
+    assert ticket.result == {'error': 'deadline exceeded'}
+    assert len(scheduler) == 0
+
+
+def test_doomed_while_queued(scheduler):
+    started, release = threading.Event(), threading.Event()
+    scheduler.submit(lambda: started.set() or release.wait(1))
+    started.wait(1)
+    ticket = scheduler.submit(lambda: {}, deadline=time.time() + 0.05)
+    time.sleep(0.1)
+    release.set()
+    assert ticket.wait(1) == {'error': 'deadline exceeded'}
+
+
+def test_failure(scheduler):
+    ticket = scheduler.submit(lambda: {}, deadline=time.time() + 1,
+                              estimate=lambda: 10, failure=lambda error: [])
+    assert ticket.result == []
+    ticket = scheduler.submit(int, ('testerror',),
+                              failure=lambda error: [error])
+    assert ticket.wait(1)[0].startswith('invalid literal')
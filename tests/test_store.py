@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Storj Labs
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import hashlib
+import time
+
+import pytest
+from plowshare.store import ManifestStore, content_hash
+
+
+@pytest.fixture
+def store(tmpdir):
+    store = ManifestStore(str(tmpdir.join('manifests.db')))
+    store.put_many([
+        {'hash': 'aa', 'size': 10, 'sources': [
+            {'host_name': 'rghost', 'url': 'a1'},
+            {'host_name': 'ge_tt', 'url': 'a2', 'codec': 'zlib'},
+        ]},
+        {'hash': 'bb', 'sources': [
+            {'host_name': 'ge_tt', 'url': 'b1'},
+            {'host_name': 'rghost', 'error': 'testerror'},
+        ]},
+    ])
+    yield store
+    store.close()
+
+
+def test_content_hash(tmpdir):
+    path = tmpdir.join('file')
+    path.write_binary(b'content')
+    assert content_hash(str(path)) == hashlib.sha256(b'content').hexdigest()
+
+
+def test_get(store):
+    assert store.get('aa') == {'hash': 'aa', 'size': 10, 'sources': [
+        {'host_name': 'rghost', 'url': 'a1'},
+        {'host_name': 'ge_tt', 'url': 'a2', 'codec': 'zlib'},
+    ]}
+    assert store.get('bb') == {'hash': 'bb', 'sources': [
+        {'host_name': 'ge_tt', 'url': 'b1'}]}
+    assert store.get('cc') is None
+    assert 'aa' in store
+    assert len(store) == 2
+
+
+def test_put_replaces_sources(store):
+    store.put({'hash': 'aa', 'size': 10, 'sources': [
+        {'host_name': 'zalil_ru', 'url': 'a3'}]})
+    assert store.get('aa')['sources'] == [
+        {'host_name': 'zalil_ru', 'url': 'a3'}]
+    assert store.hashes_on_host('rghost') == []
+
+
+def test_hashes_on_host(store):
+    assert store.hashes_on_host('ge_tt') == ['aa', 'bb']
+    assert store.hashes_on_host('rghost') == ['aa']
+
+
+def test_iter(store, monkeypatch):
+    monkeypatch.setattr('plowshare.settings.STORE_PAGE_SIZE', 1)
+    assert [m['hash'] for m in store] == ['aa', 'bb']
+    assert list(store)[0] == store.get('aa')
+
+
+def test_put_many_from_store(store, monkeypatch):
+    monkeypatch.setattr('plowshare.settings.STORE_PAGE_SIZE', 1)
+
+    def repair(manifests):
+        for manifest in manifests:
+            yield dict(manifest, sources=[
+                {'host_name': 'rghost', 'url': manifest['hash'] + '3'}])
+
+    store.put_many(repair(store))
+    assert [m['sources'] for m in store] == [
+        [{'host_name': 'rghost', 'url': 'aa3'}],
+        [{'host_name': 'rghost', 'url': 'bb3'}]]
+
+
+def test_add_upload(tmpdir):
+    path = tmpdir.join('file')
+    path.write_binary(b'content')
+    store = ManifestStore()
+    before = time.time()
+    manifest = store.add_upload(str(path), [
+        {'host_name': 'rghost', 'url': 'testurl'},
+        {'host_name': 'ge_tt', 'url': 'oldurl', 'uploaded_at': 1}])
+    uploaded_at = manifest['sources'][0]['uploaded_at']
+    assert before <= uploaded_at <= time.time()
+    assert store.get(manifest['hash']) == {
+        'hash': hashlib.sha256(b'content').hexdigest(), 'size': 7,
+        'sources': [
+            {'host_name': 'rghost', 'url': 'testurl',
+             'uploaded_at': uploaded_at},
+            {'host_name': 'ge_tt', 'url': 'oldurl', 'uploaded_at': 1}]}
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Storj Labs
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import os
+
+from plowshare.swarm import RangeScheduler, split_ranges, write_at
+
+
+def test_split_ranges():
+    assert split_ranges(10, 4) == [(0, 4), (4, 4), (8, 2)]
+    assert split_ranges(0, 4) == []
+
+
+def test_write_at(tmpdir):
+    path = str(tmpdir.join('out'))
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT)
+    try:
+        os.ftruncate(fd, 6)
+        write_at(fd, 3, b'def')
+        write_at(fd, 0, b'abc')
+    finally:
+        os.close(fd)
+    with open(path, 'rb') as f:
+        assert f.read() == b'abcdef'
+
+
+def test_range_scheduler():
+    scheduler = RangeScheduler(8, 4)
+    first, second = scheduler.next(), scheduler.next()
+    assert (first, second) == ((0, 4), (4, 4))
+    assert scheduler.complete(first)
+    assert not scheduler.finished
+
+
+def test_range_scheduler_steal():
+    scheduler = RangeScheduler(4, 4)
+    chunk = scheduler.next()
+    # The queue is empty, so an idle worker steals the in-flight range.
+    assert scheduler.next() == chunk
+    assert scheduler.next() is None
+    assert scheduler.complete(chunk)
+    assert not scheduler.complete(chunk)
+    assert scheduler.finished
+
+
+def test_range_scheduler_fail():
+    scheduler = RangeScheduler(4, 4)
+    chunk = scheduler.next()
+    scheduler.fail(chunk)
+    assert scheduler.next() == chunk